@@ -5,6 +5,9 @@ from .devicons import *
 
 SEPARATOR = os.getenv('RANGER_DEVICONS_SEPARATOR', ' ')
 
+def title(file):
+  return devicon(file) + SEPARATOR + file.relative_path
+
 @ranger.api.register_linemode
 class DevIconsLinemode(LinemodeBase):
   name = "devicons"
@@ -12,4 +15,4 @@ class DevIconsLinemode(LinemodeBase):
   uses_metadata = False
 
   def filetitle(self, file, metadata):
-    return devicon(file) + SEPARATOR + file.relative_path
+    return cached(file, 'title', title)
@@ -1,446 +1,150 @@
 #!/usr/bin/python
 # coding=UTF-8
-# These glyphs, and the mapping of file extensions to glyphs
-# has been copied from the vimscript code that is present in
-# https://github.com/ryanoasis/vim-devicons
+# Glyphs for ranger's devicons linemode. The tables mapping names and
+# extensions to glyphs are in _devicons_tables.py, and are only loaded
+# when the first icon is looked up, so that importing this plugin costs
+# next to nothing when ranger starts.
 
-import re
 import os
+from collections import OrderedDict
 
+TABLES_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_devicons_tables.py')
+TABLES = ('file_node_extensions', 'dir_node_exact_matches', 'file_node_exact_matches')
+# Compiled tables, keyed on the hash of their source
+TABLES_CACHE = os.path.join(os.getenv('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                            'ranger', 'devicons-%s.marshal')
+icon_tables = None
 
-# Get the XDG_USER_DIRS directory names from environment variables
-xdgs_dirs = {
-    os.path.basename(os.getenv(key).rstrip('/')): icon
-    for key, icon in (
-        ('XDG_DOCUMENTS_DIR', ''),
-        ('XDG_DOWNLOAD_DIR', ''),
-        ('XDG_CONFIG_DIR', ''),
-        ('XDG_MUSIC_DIR', ''),
-        ('XDG_PICTURES_DIR', ''),
-        ('XDG_PUBLICSHARE_DIR', ''),
-        ('XDG_TEMPLATES_DIR', ''),
-        ('XDG_VIDEOS_DIR', ''),
-    )
-    if os.getenv(key)
-}
 
+def user_dirs():
+    """The XDG_USER_DIRS directory names from environment variables."""
+    return {
+        os.path.basename(os.getenv(key).rstrip('/')): icon
+        for key, icon in (
+            ('XDG_DOCUMENTS_DIR', ''),
+            ('XDG_DOWNLOAD_DIR', ''),
+            ('XDG_CONFIG_DIR', ''),
+            ('XDG_MUSIC_DIR', ''),
+            ('XDG_PICTURES_DIR', ''),
+            ('XDG_PUBLICSHARE_DIR', ''),
+            ('XDG_TEMPLATES_DIR', ''),
+            ('XDG_VIDEOS_DIR', ''),
+        )
+        if os.getenv(key)
+    }
 
-# all those glyphs will show as weird squares if you don't have the correct patched font
-# My advice is to use NerdFonts which can be found here:
-# https://github.com/ryanoasis/nerd-fonts
-file_node_extensions = {
-    '7z'       : '',
-    'a'        : '',
-    'ai'       : '',
-    'apk'      : '',
-    'asm'      : '',
-    'asp'      : '',
-    'aup'      : '',
-    'avi'      : '',
-    'awk'      : '',
-    'bash'     : '',
-    'bat'      : '',
-    'bmp'      : '',
-    'bz2'      : '',
-    'c'        : '',
-    'c++'      : '',
-    'cab'      : '',
-    'cbr'      : '',
-    'cbz'      : '',
-    'cc'       : '',
-    'class'    : '',
-    'clj'      : '',
-    'cljc'     : '',
-    'cljs'     : '',
-    'cmake'    : '',
-    'coffee'   : '',
-    'conf'     : '',
-    'cp'       : '',
-    'cpio'     : '',
-    'cpp'      : '',
-    'cs'       : '󰌛',
-    'csh'      : '',
-    'css'      : '',
-    'cue'      : '',
-    'cvs'      : '',
-    'cxx'      : '',
-    'd'        : '',
-    'dart'     : '',
-    'db'       : '',
-    'deb'      : '',
-    'diff'     : '',
-    'dll'      : '',
-    'wps'      : '',
-    'wpt'      : '',
-    'doc'      : '',
-    'docx'     : '',
-    'docm'     : '',
-    'dotx'     : '',
-    'dotm'     : '',
-    'dump'     : '',
-    'edn'      : '',
-    'eex'      : '',
-    'efi'      : '',
-    'ejs'      : '',
-    'elf'      : '',
-    'elm'      : '',
-    'epub'     : '',
-    'erl'      : '',
-    'ex'       : '',
-    'exe'      : '',
-    'exs'      : '',
-    'f#'       : '',
-    'fifo'     : '󰟥',
-    'fish'     : '',
-    'flac'     : '',
-    'flv'      : '',
-    'fs'       : '',
-    'fsi'      : '',
-    'fsscript' : '',
-    'fsx'      : '',
-    'gem'      : '',
-    'gemspec'  : '',
-    'gif'      : '',
-    'go'       : '',
-    'gz'       : '',
-    'gzip'     : '',
-    'h'        : '',
-    'haml'     : '',
-    'hbs'      : '',
-    'hh'       : '',
-    'hpp'      : '',
-    'hrl'      : '',
-    'hs'       : '',
-    'htaccess' : '',
-    'htm'      : '',
-    'html'     : '',
-    'htpasswd' : '',
-    'hxx'      : '',
-    'ico'      : '',
-    'img'      : '',
-    'ini'      : '',
-    'ipynb'    : '',
-    'iso'      : '',
-    'jar'      : '',
-    'java'     : '',
-    'jl'       : '',
-    'jpeg'     : '',
-    'jpg'      : '',
-    'js'       : '',
-    'json'     : '',
-    'jsonc'    : '',
-    'jsx'      : '',
-    'key'      : '',
-    'ksh'      : '',
-    'leex'     : '',
-    'less'     : '',
-    'lha'      : '',
-    'lhs'      : '',
-    'log'      : '',
-    'lua'      : '',
-    'lz'       : '',
-    'lzh'      : '',
-    'lzma'     : '',
-    'm4a'      : '',
-    'm4v'      : '',
-    'markdown' : '',
-    'md'       : '',
-    'mdx'      : '',
-    'mjs'      : '',
-    'mka'      : '',
-    'mkv'      : '',
-    'ml'       : 'λ',
-    'mli'      : 'λ',
-    'mov'      : '',
-    'mp3'      : '',
-    'mp4'      : '',
-    'mpeg'     : '',
-    'mpg'      : '',
-    'msi'      : '',
-    'mustache' : '',
-    'nix'      : '',
-    'o'        : '',
-    'ogg'      : '',
-    'opus'     : '',
-    'part'     : '',
-    'pdf'      : '',
-    'php'      : '',
-    'pl'       : '',
-    'pm'       : '',
-    'png'      : '',
-    'pp'       : '',
-    'dps'      : '',
-    'dpt'      : '',
-    'ppt'      : '',
-    'pptx'     : '',
-    'pptm'     : '',
-    'pot'      : '',
-    'potx'     : '',
-    'potm'     : '',
-    'pps'      : '',
-    'ppsx'     : '',
-    'ppsm'     : '',
-    'ps1'      : '',
-    'psb'      : '',
-    'psd'      : '',
-    'pub'      : '',
-    'py'       : '',
-    'pyc'      : '',
-    'pyd'      : '',
-    'pyo'      : '',
-    'r'        : '󰟔',
-    'rake'     : '',
-    'rar'      : '',
-    'rb'       : '',
-    'rc'       : '',
-    'rlib'     : '',
-    'rmd'      : '',
-    'rom'      : '',
-    'rpm'      : '',
-    'rproj'    : '󰗆',
-    'rs'       : '',
-    'rss'      : '',
-    'rtf'      : '',
-    's'        : '',
-    'sass'     : '',
-    'scala'    : '',
-    'scss'     : '',
-    'sh'       : '',
-    'slim'     : '',
-    'sln'      : '',
-    'so'       : '',
-    'sql'      : '',
-    'styl'     : '',
-    'suo'      : '',
-    'svelte'   : '',
-    'swift'    : '',
-    't'        : '',
-    'tar'      : '',
-    'tex'      : '󰙩',
-    'tgz'      : '',
-    'toml'     : '',
-    'torrent'  : '',
-    'ts'       : '',
-    'tsx'      : '',
-    'twig'     : '',
-    'vim'      : '',
-    'vimrc'    : '',
-    'vue'      : '󰡄',
-    'wav'      : '',
-    'webm'     : '',
-    'webmanifest' : '',
-    'webp'     : '',
-    'xbps'     : '',
-    'xcplayground' : '',
-    'xhtml'    : '',
-    'et'       : '󰈛',
-    'ett'      : '󰈛',
-    'xls'      : '󰈛',
-    'xlt'      : '󰈛',
-    'xlsx'     : '󰈛',
-    'xlsm'     : '󰈛',
-    'xlsb'     : '󰈛',
-    'xltx'     : '󰈛',
-    'xltm'     : '󰈛',
-    'xla'      : '󰈛',
-    'xlam'     : '󰈛',
-    'xml'      : '',
-    'xul'      : '',
-    'xz'       : '',
-    'yaml'     : '',
-    'yml'      : '',
-    'zip'      : '',
-    'zsh'      : '',
-}
 
+def load_tables():
+    """{table name: table} from the cache when it matches _devicons_tables.py,
+    compiled from that file (and cached) otherwise."""
+    global icon_tables
+    # Only needed here, importing them would slow down ranger's start
+    import marshal
+    import hashlib
+    with open(TABLES_SOURCE, 'rb') as stream:
+        source = stream.read()
+    cache = TABLES_CACHE % hashlib.sha1(source + ('marshal=%d' % marshal.version).encode()).hexdigest()
+    try:
+        with open(cache, 'rb') as stream:
+            tables = marshal.loads(stream.read())
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        namespace = {}
+        exec(compile(source, TABLES_SOURCE, 'exec'), namespace)
+        tables = dict((name, namespace[name]) for name in TABLES)
+        try:
+            if not os.path.isdir(os.path.dirname(cache)):
+                os.makedirs(os.path.dirname(cache))
+            with open(cache + '.tmp', 'wb') as stream:
+                stream.write(marshal.dumps(tables))
+            os.rename(cache + '.tmp', cache)
+        except (IOError, OSError):
+            pass
+    # These come from the environment, so they are never cached
+    tables['xdgs_dirs'] = user_dirs()
+    tables['dir_node_exact_matches'].update(tables['xdgs_dirs'])
+    # {last part: most parts} of the extensions with several parts, the
+    # only ones longest_extension() has to look further back for
+    tables['extension_parts'] = {}
+    for extension in tables['file_node_extensions']:
+        last = extension.rsplit('.', 1)[-1]
+        parts = extension.count('.') + 1
+        if parts > tables['extension_parts'].get(last, 1):
+            tables['extension_parts'][last] = parts
+    globals().update(tables)
+    icon_tables = tables
+    return tables
 
-dir_node_exact_matches = {
-# English
-    '.git'                             : '',
-    'Desktop'                          : '',
-    'Documents'                        : '',
-    'Downloads'                        : '',
-    'Dotfiles'                         : '',
-    'Dropbox'                          : '',
-    'Music'                            : '',
-    'Pictures'                         : '',
-    'Public'                           : '',
-    'Templates'                        : '',
-    'Videos'                           : '',
-    'anaconda3'                        : '',
-    'go'                               : '',
-    'workspace'                        : '',
-    'OneDrive'                         : '',
-# Spanish
-    'Escritorio'                       : '',
-    'Documentos'                       : '',
-    'Descargas'                        : '',
-    'Música'                           : '',
-    'Imágenes'                         : '',
-    'Público'                          : '',
-    'Plantillas'                       : '',
-    'Vídeos'                           : '',
-# French
-    'Bureau'                           : '',
-    'Documents'                        : '',
-    'Images'                           : '',
-    'Musique'                          : '',
-    'Publique'                         : '',
-    'Téléchargements'                  : '',
-    'Vidéos'                           : '',
-# Portuguese
-    'Documentos'                       : '',
-    'Imagens'                          : '',
-    'Modelos'                          : '',
-    'Música'                           : '',
-    'Público'                          : '',
-    'Vídeos'                           : '',
-    'Área de trabalho'                 : '',
-# Italian
-    'Documenti'                        : '',
-    'Immagini'                         : '',
-    'Modelli'                          : '',
-    'Musica'                           : '',
-    'Pubblici'                         : '',
-    'Scaricati'                        : '',
-    'Scrivania'                        : '',
-    'Video'                            : '',
-# German
-    'Bilder'                           : '',
-    'Dokumente'                        : '',
-    'Musik'                            : '',
-    'Schreibtisch'                     : '',
-    'Vorlagen'                         : '',
-    'Öffentlich'                       : '',
-# Hungarian
-    'Dokumentumok'                     : '',
-    'Képek'                            : '',
-    'Modelli'                          : '',
-    'Zene'                             : '',
-    'Letöltések'                       : '',
-    'Számítógép'                       : '',
-    'Videók'                           : '',
-# Chinese(Simple)
-    '桌面'                             : '',
-    '文档'                             : '',
-    '下载'                             : '',
-    '音乐'                             : '',
-    '图片'                             : '',
-    '公共的'                           : '',
-    '公共'                           : '',
-    '模板'                             : '',
-    '视频'                             : '',
-# Chinese(Traditional)
-    '桌面'                             : '',
-    '文檔'                             : '',
-    '下載'                             : '',
-    '音樂'                             : '',
-    '圖片'                             : '',
-    '公共的'                           : '',
-    '公共'                           : '',
-    '模板'                             : '',
-    '視頻'                             : '',
-}
 
-# Python 2.x-3.4 don't support unpacking syntex `{**dict}`
-# XDG_USER_DIRS
-dir_node_exact_matches.update(xdgs_dirs)
+def __getattr__(name):
+    # The tables only become globals once they are loaded
+    if name in TABLES or name in ('xdgs_dirs', 'extension_parts'):
+        return load_tables()[name]
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 
-file_node_exact_matches = {
-    '.bash_aliases'                    : '',
-    '.bash_history'                    : '',
-    '.bash_logout'                     : '',
-    '.bash_profile'                    : '',
-    '.bashprofile'                     : '',
-    '.bashrc'                          : '',
-    '.dmrc'                            : '',
-    '.DS_Store'                        : '',
-    '.fasd'                            : '',
-    '.fehbg'                           : '',
-    '.gitattributes'                   : '',
-    '.gitconfig'                       : '',
-    '.gitignore'                       : '',
-    '.gitlab-ci.yml'                   : '',
-    '.gvimrc'                          : '',
-    '.inputrc'                         : '',
-    '.jack-settings'                   : '',
-    '.mime.types'                      : '',
-    '.ncmpcpp'                         : '',
-    '.nvidia-settings-rc'              : '',
-    '.pam_environment'                 : '',
-    '.profile'                         : '',
-    '.recently-used'                   : '',
-    '.selected_editor'                 : '',
-    '.vim'                             : '',
-    '.viminfo'                         : '',
-    '.vimrc'                           : '',
-    '.Xauthority'                      : '',
-    '.Xdefaults'                       : '',
-    '.xinitrc'                         : '',
-    '.xinputrc'                        : '',
-    '.Xresources'                      : '',
-    '.zshrc'                           : '',
-    '_gvimrc'                          : '',
-    '_vimrc'                           : '',
-    'a.out'                            : '',
-    'authorized_keys'                  : '',
-    'bspwmrc'                          : '',
-    'cmakelists.txt'                   : '',
-    'config'                           : '',
-    'config.ac'                        : '',
-    'config.m4'                        : '',
-    'config.mk'                        : '',
-    'config.ru'                        : '',
-    'configure'                        : '',
-    'docker-compose.yml'               : '',
-    'dockerfile'                       : '',
-    'Dockerfile'                       : '',
-    'dropbox'                          : '',
-    'exact-match-case-sensitive-1.txt' : 'X1',
-    'exact-match-case-sensitive-2'     : 'X2',
-    'favicon.ico'                      : '',
-    'gemfile'                          : '',
-    'gruntfile.coffee'                 : '',
-    'gruntfile.js'                     : '',
-    'gruntfile.ls'                     : '',
-    'gulpfile.coffee'                  : '',
-    'gulpfile.js'                      : '',
-    'gulpfile.ls'                      : '',
-    'ini'                              : '',
-    'known_hosts'                      : '',
-    'ledger'                           : '',
-    'license'                          : '',
-    'LICENSE'                          : '',
-    'LICENSE.md'                       : '',
-    'LICENSE.txt'                      : '',
-    'Makefile'                         : '',
-    'makefile'                         : '',
-    'Makefile.ac'                      : '',
-    'Makefile.in'                      : '',
-    'mimeapps.list'                    : '',
-    'mix.lock'                         : '',
-    'node_modules'                     : '',
-    'package-lock.json'                : '',
-    'package.json'                     : '',
-    'playlists'                        : '',
-    'procfile'                         : '',
-    'Rakefile'                         : '',
-    'rakefile'                         : '',
-    'react.jsx'                        : '',
-    'README'                           : '',
-    'README.markdown'                  : '',
-    'README.md'                        : '',
-    'README.rst'                       : '',
-    'README.txt'                       : '',
-    'sxhkdrc'                          : '',
-    'user-dirs.dirs'                   : '',
-    'webpack.config.js'                : '',
-}
+# Icons and titles of the files in the most recently drawn directories,
+# oldest first: {directory: (generation, {(kind, is_directory, name): value})}
+CACHED_DIRECTORIES = 64
+listing_cache = OrderedDict()
+# The listing drawn last, to skip the LRU bookkeeping while drawing it:
+# [directory, generation, values]
+current_listing = [None, None, None]
+
+
+def cached(file, kind, compute):
+    """compute(file), remembered for the directory listing the file until
+    ranger loads that directory again."""
+    directory = file.dirname
+    listing = file.fm.directories.get(directory)
+    # The mtime ranger saw when it last (re)loaded the listing
+    loaded = listing.load_content_mtime if listing is not None else None
+    if current_listing[0] == directory and current_listing[1] == loaded:
+        values = current_listing[2]
+    else:
+        generation, values = listing_cache.get(directory, (None, None))
+        if values is None or generation != loaded:
+            values = {}
+            listing_cache[directory] = (loaded, values)
+            if len(listing_cache) > CACHED_DIRECTORIES:
+                listing_cache.popitem(last=False)
+        else:
+            listing_cache.move_to_end(directory)
+        current_listing[:] = [directory, loaded, values]
+    key = (kind, file.is_directory, file.relative_path)
+    try:
+        return values[key]
+    except KeyError:
+        value = values[key] = compute(file)
+        return value
 
 
 def devicon(file):
+    return cached(file, 'icon', lookup_devicon)
+
+
+def lookup_devicon(file):
+    if icon_tables is None:
+        load_tables()
     if file.is_directory:
         return dir_node_exact_matches.get(file.relative_path, '')
-    return file_node_exact_matches.get(os.path.basename(file.relative_path),
-                                       file_node_extensions.get(file.extension, ''))
+    name = os.path.basename(file.relative_path)
+    extension = file.extension
+    parts = extension_parts.get(extension)
+    if parts:
+        extension = longest_extension(name, extension, parts)
+    return file_node_exact_matches.get(name, file_node_extensions.get(extension, ''))
+
+
+def longest_extension(name, extension, parts):
+    """The longest extension in the tables, of at most parts parts, that name
+    ends with, or extension, its last part, if there is none."""
+    longest = extension
+    start = len(name) - len(extension) - 1
+    for part in range(1, parts):
+        start = name.rfind('.', 0, start)
+        if start < 0:
+            break
+        candidate = name[start + 1:].lower()
+        if candidate in file_node_extensions:
+            longest = candidate
+    return longest
@@ -0,0 +1,242 @@
+#!/usr/bin/python3
+
+# Benchmark the asset renderers without Inkscape or optipng installed:
+# the real gtk3 and wm SVGs are rendered in a scratch directory against
+# stand-ins that speak the `inkscape --shell` prompt protocol and write
+# placeholder PNGs after a configurable delay.
+
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+THEMEDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name: (script directory, script)
+TARGETS = {
+    'gtk3': ('gtk-3.20/assets', 'render-gtk3-assets.py'),
+    'wm': ('src', 'render-wm-assets.py'),
+}
+
+LIBRARY = 'render_assets.py'
+
+# Runs a renderer in-process so /proc/self/io counts its syscalls and not
+# those of the Python start-up
+LAUNCHER = '''
+import sys, json, runpy
+def io():
+    with open('/proc/self/io') as stream:
+        return dict((key, int(value)) for key, value in
+                    (line.split(':') for line in stream))
+stats, sys.argv = sys.argv[1], sys.argv[2:]
+before = io()
+status = 0
+try:
+    runpy.run_path(sys.argv[0], run_name='__main__')
+except SystemExit as exit:
+    status = exit.code or 0
+after = io()
+with open(stats, 'w') as stream:
+    json.dump({'status': status,
+               'syscalls': after['syscr'] + after['syscw'] - before['syscr'] - before['syscw']},
+              stream)
+'''
+
+
+def png(path, width, height):
+    """Write a PNG of one colour, taken from the path so that different
+    assets never share their bytes (and the optipng cache)."""
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data +
+                struct.pack('>I', zlib.crc32(kind + data)))
+    colour = struct.pack('>I', zlib.crc32(path.encode('utf-8')))
+    rows = b''.join(b'\0' + colour * width for row in range(height))
+    with open(path, 'wb') as stream:
+        stream.write(b'\x89PNG\r\n\x1a\n' +
+                     chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)) +
+                     chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b''))
+
+
+def fake_inkscape(argv):
+    """Stand-in for `inkscape --shell`: both the 0.92 command lines and
+    Inkscape 1.x action lists, BENCH_LATENCY seconds per export."""
+    latency = float(os.environ.get('BENCH_LATENCY', '0'))
+    out = sys.stdout.buffer
+    out.write(b'Inkscape interactive shell mode. Type \'quit\' to quit.\n>')
+    out.flush()
+    for line in sys.stdin:
+        line = line.strip()
+        if line == 'quit':
+            break
+        exports = []
+        if not line.startswith('-'):
+            dpi = 96
+            for action in line.split(';'):
+                name, _, value = action.partition(':')
+                if name == 'export-dpi':
+                    dpi = int(value)
+                elif name == 'export-filename':
+                    exports.append((value, dpi))
+        else:
+            words = line.split()
+            dpi = 96
+            for word in words:
+                if word.startswith('--export-dpi='):
+                    dpi = int(word.split('=')[1])
+            if '-e' in words:
+                exports.append((words[words.index('-e') + 1], dpi))
+        for path, dpi in exports:
+            time.sleep(latency)
+            size = int(16 * dpi / 96 + 0.5)
+            png(path, size, size)
+        out.write(b'\n>')
+        out.flush()
+
+
+def stand_in(bindir, name):
+    """Write an executable stand-in for name into bindir and return its path."""
+    path = os.path.join(bindir, name)
+    with open(path, 'w') as stream:
+        if name == 'optipng':
+            # Plain sh: a Python start-up per PNG would dwarf the latency
+            stream.write('#!/bin/sh\nexec sleep "$BENCH_OPTIPNG_LATENCY"\n')
+        else:
+            stream.write('#!/bin/sh\nexec "%s" "%s" --fake-inkscape "$@"\n'
+                         % (sys.executable, os.path.abspath(__file__)))
+    os.chmod(path, 0o755)
+    return path
+
+
+def manifest_times(rundir):
+    """Exported PNG count and summed render and optipng seconds."""
+    count, render, optimize = 0, 0.0, 0.0
+    for dir, dirs, files in os.walk(rundir):
+        if '.render-local.json' in files:
+            with open(os.path.join(dir, '.render-local.json')) as stream:
+                for entry in json.load(stream).values():
+                    if 'render-time' in entry:
+                        count += 1
+                        render += entry['render-time']
+                        optimize += entry.get('optimize-time', 0.0)
+    return count, render, optimize
+
+
+def run(rundir, target, args, env):
+    """Run a renderer in rundir, return (wall seconds, exit status, syscalls)."""
+    dir, script = TARGETS[target]
+    stats = os.path.join(rundir, '.bench-stats.json')
+    start = time.monotonic()
+    # --no-daemon: a render daemon that happens to be running would skew it all
+    subprocess.run([sys.executable, '-c', LAUNCHER, stats, script, '--no-daemon'] + args,
+                   cwd=os.path.join(rundir, dir), check=True,
+                   # A cold optipng cache for every scratch copy
+                   env=dict(env, XDG_CACHE_HOME=os.path.join(rundir, 'cache')),
+                   stdout=subprocess.DEVNULL)
+    wall = time.monotonic() - start
+    with open(stats) as stream:
+        result = json.load(stream)
+    os.remove(stats)
+    return wall, result['status'], result['syscalls']
+
+
+def scratch(workdir, target):
+    """A fresh copy of the renderer and its SVGs, without any output."""
+    dir, script = TARGETS[target]
+    rundir = tempfile.mkdtemp(dir=workdir)
+    shutil.copytree(os.path.join(THEMEDIR, dir), os.path.join(rundir, dir),
+                    ignore=shutil.ignore_patterns('*.png', '.render-*', '__pycache__'))
+    # The renderer the scripts import
+    if not os.path.exists(os.path.join(rundir, 'src', LIBRARY)):
+        os.makedirs(os.path.join(rundir, 'src'), exist_ok=True)
+        shutil.copy(os.path.join(THEMEDIR, 'src', LIBRARY), os.path.join(rundir, 'src'))
+    return rundir
+
+
+def bench(workdir, target, args, env):
+    extra = ['--backend', 'inkscape'] + (['--batch', args.batch] if args.batch else [])
+    extra += ['--split'] if args.split else []
+    result = {'target': target, 'runs': []}
+
+    # Parsing alone: --plan never starts Inkscape
+    rundir = scratch(workdir, target)
+    result['parse-cold'] = run(rundir, target, ['--plan'], env)[0]
+    result['parse-warm'] = run(rundir, target, ['--plan'], env)[0]
+
+    for jobs in args.jobs:
+        rundir = scratch(workdir, target)
+        wall, status, syscalls = run(rundir, target, extra + ['--jobs', str(jobs)], env)
+        if status:
+            raise SystemExit('%s failed with --jobs %d' % (target, jobs))
+        count, render, optimize = manifest_times(rundir)
+        result['exports'] = count
+        result['runs'].append({
+            'jobs': jobs, 'wall': wall, 'render': render, 'optipng': optimize,
+            'syscalls-per-export': syscalls / count if count else 0.0,
+            })
+        # Everything is up to date now, this is the cost of a no-op build
+        result['noop'] = run(rundir, target, extra + ['--jobs', str(jobs)], env)[0]
+    return result
+
+
+def report(result):
+    print ('%s: %d exports, parse %.2fs cold / %.2fs warm, no-op build %.2fs'
+           % (result['target'], result['exports'], result['parse-cold'],
+              result['parse-warm'], result['noop']))
+    print ('  %4s %8s %8s %8s %8s %16s'
+           % ('jobs', 'wall', 'speedup', 'render', 'optipng', 'syscalls/export'))
+    base = result['runs'][0]['wall']
+    for run in result['runs']:
+        print ('  %4d %7.2fs %7.2fx %7.2fs %7.2fs %16.1f'
+               % (run['jobs'], run['wall'], base / run['wall'], run['render'],
+                  run['optipng'], run['syscalls-per-export']))
+
+
+if sys.argv[1:2] == ['--fake-inkscape']:
+    fake_inkscape(sys.argv[2:])
+    sys.exit(0)
+
+parser = argparse.ArgumentParser(description='Benchmark the asset renderers against '
+                                 'stand-ins for Inkscape and optipng')
+parser.add_argument('targets', nargs='*',
+                    help='renderers to benchmark: %s (default: all)' % ', '.join(sorted(TARGETS)))
+parser.add_argument('-j', '--jobs', default=[1, 2, 4],
+                    type=lambda value: [int(jobs) for jobs in value.split(',')],
+                    help='comma separated job counts to compare (default: 1,2,4)')
+parser.add_argument('--latency', type=float, default=0.05,
+                    help='seconds the fake Inkscape takes per export (default: %(default)s)')
+parser.add_argument('--optipng-latency', type=float, default=0.02,
+                    help='seconds the fake optipng takes per PNG (default: %(default)s)')
+parser.add_argument('--batch', choices=['layer', 'svg'],
+                    help='pass --batch on to the renderers')
+parser.add_argument('--split', action='store_true',
+                    help='pass --split on to the renderers')
+parser.add_argument('--json', action='store_true',
+                    help='print the results as JSON, for comparing runs')
+args = parser.parse_args()
+for target in args.targets:
+    if target not in TARGETS:
+        parser.error('unknown target %s' % target)
+
+workdir = tempfile.mkdtemp(prefix='bench-render-assets-')
+try:
+    env = dict(os.environ,
+               INKSCAPE=stand_in(workdir, 'inkscape'),
+               OPTIPNG=stand_in(workdir, 'optipng'),
+               RSVG_CONVERT=os.path.join(workdir, 'no-rsvg-convert'),
+               BENCH_LATENCY=str(args.latency),
+               BENCH_OPTIPNG_LATENCY=str(args.optipng_latency))
+    results = [bench(workdir, target, args, env) for target in args.targets or sorted(TARGETS)]
+finally:
+    shutil.rmtree(workdir)
+
+if args.json:
+    print (json.dumps(results, indent=2))
+else:
+    for result in results:
+        report(result)
@@ -0,0 +1,266 @@
+#!/usr/bin/python3
+
+# Bundle the stylesheets of the GTK directories and the assets they use
+# into a gtk.gresource next to them. GTK registers a gtk.gresource found in
+# the theme directory, so a stylesheet that imports the resource:// copy
+# loads everything from that one mmapped file.
+#
+# glib-compile-resources is used when it is installed; otherwise the bundle
+# is written here, in the same GVDB format.
+
+import os
+import re
+import sys
+import zlib
+import struct
+import argparse
+import tempfile
+import subprocess
+
+THEMEDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GLIB_COMPILE_RESOURCES = os.environ.get('GLIB_COMPILE_RESOURCES',
+                                        '/usr/bin/glib-compile-resources')
+GTK_DIRS = ['gtk-3.20', 'gtk-4.0']
+STYLESHEETS = ['gtk.css', 'gtk-dark.css']
+BUNDLE = 'gtk.gresource'
+URL = re.compile(r'''url\(\s*(["']?)([^"')]+)\1\s*\)''')
+
+GVDB_SIGNATURE = b'GVariant'
+GVDB_ITEM = struct.Struct('<IIIHccII')
+GVDB_NO_PARENT = 0xffffffff
+RESOURCE_COMPRESSED = 1
+
+
+def resource_prefix():
+    """/themes/<Name> with the theme name from index.theme."""
+    with open(os.path.join(THEMEDIR, 'index.theme')) as stream:
+        for line in stream:
+            key, _, value = line.partition('=')
+            if key.strip() == 'Name':
+                return '/themes/' + value.strip()
+    return '/themes/' + os.path.basename(THEMEDIR)
+
+
+def variant_name(stylesheet):
+    """gtk.css -> gtk-gresource.css"""
+    return stylesheet[:-4] + '-gresource.css'
+
+
+def bundle_contents(gtk_dir):
+    """{resource path: bytes} that belong in the bundle of gtk_dir.
+
+    That is its stylesheets, with every url() of a file in the theme
+    pointing at the resource:// copy, and those files.
+    """
+    prefix = resource_prefix()
+    contents = {}
+
+    def resource(match):
+        url = match.group(2)
+        if ':' in url:
+            return match.group(0)
+        file = os.path.normpath(os.path.join(THEMEDIR, gtk_dir, url))
+        if not os.path.isfile(file):
+            return match.group(0)
+        name = prefix + '/' + os.path.relpath(file, THEMEDIR).replace(os.sep, '/')
+        with open(file, 'rb') as stream:
+            contents[name] = stream.read()
+        return 'url("resource://%s")' % name
+
+    for stylesheet in STYLESHEETS:
+        path = os.path.join(THEMEDIR, gtk_dir, stylesheet)
+        if os.path.exists(path):
+            with open(path) as stream:
+                css = URL.sub(resource, stream.read())
+            contents['%s/%s/%s' % (prefix, gtk_dir, stylesheet)] = css.encode('utf-8')
+    return contents
+
+
+def gvdb_hash(key):
+    value = 5381
+    for byte in key:
+        # gvdb hashes signed chars
+        value = (value * 33 + (byte - 256 if byte > 127 else byte)) & 0xffffffff
+    return value
+
+
+def write_gresource(path, contents):
+    """Write {resource path: bytes} as an uncompressed GResource bundle, the
+    GVDB file glib-compile-resources would write."""
+    # Every directory is an item as well, listing its children
+    parents = {}
+    for name in contents:
+        key = name
+        while key != '/':
+            parents[key] = key[:key.rstrip('/').rindex('/') + 1]
+            key = parents[key]
+    keys = sorted(set(parents) | set(['/']))
+    count = len(keys)
+    hashes = dict((key, gvdb_hash(key.encode('utf-8'))) for key in keys)
+    # Items are grouped by bucket, each bucket holds the number of its first item
+    keys.sort(key=lambda key: hashes[key] % count)
+    numbers = dict((key, number) for number, key in enumerate(keys))
+
+    # Header, then the hash table with no bloom filter, then keys and values
+    table = 24
+    items = table + 8 + 4 * count
+    data = bytearray(items + GVDB_ITEM.size * count)
+
+    def append(chunk, alignment=1):
+        data.extend(b'\0' * (-len(data) % alignment))
+        start = len(data)
+        data.extend(chunk)
+        return start, len(data)
+
+    buckets = [0] * count
+    for key in keys:
+        for bucket in range(hashes[key] % count + 1, count):
+            buckets[bucket] += 1
+    struct.pack_into('<8sIIII', data, 0, GVDB_SIGNATURE, 0, 0, table, len(data))
+    struct.pack_into('<II%dI' % count, data, table, 0, count, *buckets)
+
+    for number, key in enumerate(keys):
+        parent = parents.get(key)
+        own = key[len(parent):] if parent else key
+        key_start, key_end = append(own.encode('utf-8'))
+        if key in contents:
+            # A 'v' holding (uuay): size, flags and the data plus a nul
+            value = (struct.pack('<II', len(contents[key]), 0) + contents[key] +
+                     b'\0\0(uuay)')
+            kind = b'v'
+            start, end = append(value, 8)
+        else:
+            children = sorted(numbers[child] for child in keys if parents.get(child) == key)
+            kind = b'L'
+            start, end = append(struct.pack('<%dI' % len(children), *children), 4)
+        GVDB_ITEM.pack_into(data, items + GVDB_ITEM.size * number, hashes[key],
+                            GVDB_NO_PARENT if parent is None else numbers[parent],
+                            key_start, key_end - key_start, kind, b'\0', start, end)
+
+    with open(path, 'wb') as stream:
+        stream.write(data)
+
+
+def read_gresource(path):
+    """{resource path: bytes} of a little endian GResource bundle."""
+    with open(path, 'rb') as stream:
+        data = stream.read()
+    if data[:8] != GVDB_SIGNATURE:
+        raise ValueError('%s is not a GResource bundle' % path)
+    start, end = struct.unpack_from('<II', data, 16)
+    bloom_words, buckets = struct.unpack_from('<II', data, start)
+    items = start + 8 + 4 * (bloom_words & ((1 << 27) - 1)) + 4 * buckets
+    entries = [GVDB_ITEM.unpack_from(data, position)
+               for position in range(items, end - GVDB_ITEM.size + 1, GVDB_ITEM.size)]
+
+    keys = {}
+
+    def key(number):
+        if number not in keys:
+            hash, parent, key_start, key_size = entries[number][:4]
+            own = data[key_start:key_start+key_size].decode('utf-8')
+            keys[number] = (key(parent) if parent != GVDB_NO_PARENT else '') + own
+        return keys[number]
+
+    contents = {}
+    for number, entry in enumerate(entries):
+        kind, value_start, value_end = entry[4], entry[6], entry[7]
+        if kind != b'v':
+            continue
+        # Drop the type string of the 'v', what is left is the (uuay)
+        value = data[value_start:value_end]
+        value = value[:value.rindex(b'\0')]
+        size, flags = struct.unpack_from('<II', value)
+        body = value[8:]
+        if flags & RESOURCE_COMPRESSED:
+            body = zlib.decompress(body)
+        contents[key(number)] = body[:size]
+    return contents
+
+
+def build(gtk_dir):
+    contents = bundle_contents(gtk_dir)
+    target = os.path.join(THEMEDIR, gtk_dir, BUNDLE)
+    if os.path.exists(GLIB_COMPILE_RESOURCES):
+        with tempfile.TemporaryDirectory() as staging:
+            files = ''
+            for name, data in sorted(contents.items()):
+                path = os.path.join(staging, name.lstrip('/'))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as stream:
+                    stream.write(data)
+                files += '    <file>%s</file>\n' % name.lstrip('/')
+            xml = os.path.join(staging, BUNDLE + '.xml')
+            with open(xml, 'w') as stream:
+                stream.write('<?xml version="1.0" encoding="UTF-8"?>\n<gresources>\n'
+                             '  <gresource prefix="/">\n%s  </gresource>\n</gresources>\n'
+                             % files)
+            subprocess.run([GLIB_COMPILE_RESOURCES, '--target=' + target,
+                            '--sourcedir=' + staging, xml], check=True)
+    else:
+        write_gresource(target, contents)
+
+    for stylesheet in STYLESHEETS:
+        if os.path.exists(os.path.join(THEMEDIR, gtk_dir, stylesheet)):
+            with open(os.path.join(THEMEDIR, gtk_dir, variant_name(stylesheet)), 'w') as stream:
+                stream.write('@import url("resource://%s/%s/%s");\n'
+                             % (resource_prefix(), gtk_dir, stylesheet))
+    print ('%s: %d resources, %d bytes' % (os.path.relpath(target, THEMEDIR), len(contents),
+                                          os.path.getsize(target)))
+
+
+def check(gtk_dir):
+    """Compare the bundle of gtk_dir with the stylesheets and assets on
+    disk, and return what does not match."""
+    target = os.path.join(THEMEDIR, gtk_dir, BUNDLE)
+    if not os.path.exists(target):
+        return ['%s is missing' % BUNDLE]
+    try:
+        bundled = read_gresource(target)
+    except (ValueError, struct.error) as error:
+        return ['%s cannot be read: %s' % (BUNDLE, error)]
+    expected = bundle_contents(gtk_dir)
+    problems = []
+    for name in sorted(set(expected) | set(bundled)):
+        if name not in bundled:
+            problems.append('%s is not in the bundle' % name)
+        elif name not in expected:
+            problems.append('%s is in the bundle but no stylesheet uses it' % name)
+        elif bundled[name] != expected[name]:
+            problems.append('%s differs from the file on disk' % name)
+    for stylesheet in STYLESHEETS:
+        variant = os.path.join(THEMEDIR, gtk_dir, variant_name(stylesheet))
+        if os.path.exists(os.path.join(THEMEDIR, gtk_dir, stylesheet)):
+            try:
+                with open(variant) as stream:
+                    urls = [match.group(2) for match in URL.finditer(stream.read())]
+            except OSError:
+                urls = []
+            if ['resource://%s/%s/%s' % (resource_prefix(), gtk_dir, stylesheet)] != urls:
+                problems.append('%s does not import the bundled %s'
+                                % (variant_name(stylesheet), stylesheet))
+    return problems
+
+
+parser = argparse.ArgumentParser(description='Bundle the GTK stylesheets and their assets '
+                                 'into a gtk.gresource per GTK directory')
+parser.add_argument('dirs', nargs='*', default=GTK_DIRS,
+                    help='GTK directories of the theme (default: %s)' % ' '.join(GTK_DIRS))
+parser.add_argument('--check', action='store_true',
+                    help='only verify the bundles against the files on disk, '
+                         'exiting with status 1 if they do not match')
+args = parser.parse_args()
+
+status = 0
+for gtk_dir in args.dirs:
+    if args.check:
+        problems = check(gtk_dir)
+        for problem in problems:
+            print ('%s: %s' % (gtk_dir, problem))
+        if problems:
+            status = 1
+        else:
+            print ('%s: %s is up to date' % (gtk_dir, BUNDLE))
+    else:
+        build(gtk_dir)
+sys.exit(status)
@@ -0,0 +1,2497 @@
+# Thanks to the GNOME theme nerds for the original source of this script
+#
+# The asset renderer behind render-gtk3-assets.py and render-wm-assets.py,
+# which are its command line. It can be imported as well:
+#
+#     import render_assets
+#     render_assets.render(['gtk-3.20/assets/gtk3-assets.svg', 'src/wm/wm-assets.svg'],
+#                          '.', scales=[1, 2], jobs=4)
+#
+# The Inkscape sessions, worker pools and caches stay up between calls, so
+# one process can render every target at every scale while Inkscape starts
+# only once; close() stops them.
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import zlib
+import struct
+import shutil
+import hashlib
+import tempfile
+import select
+import signal
+import socket
+import selectors
+import itertools
+import xml.parsers.expat
+import argparse
+import threading
+import traceback
+import subprocess
+import ctypes.util
+from concurrent.futures import ThreadPoolExecutor, wait
+
+try:
+    import cairosvg
+except ImportError:
+    cairosvg = None
+
+# The tools can be swapped out from the environment, e.g. for stand-ins
+# when benchmarking (see src/bench-render-assets.py)
+INKSCAPE = os.environ.get('INKSCAPE', '/usr/bin/inkscape')
+OPTIPNG = os.environ.get('OPTIPNG', '/usr/bin/optipng')
+RSVG_CONVERT = os.environ.get('RSVG_CONVERT', '/usr/bin/rsvg-convert')
+# Where the command line renders from and to, see main()
+MAINDIR = '.'
+SRC = os.path.join('.', '')
+DPI = 96
+# The @2 assets have always been exported at 180 dpi
+SCALE_DPI = {2: 180}
+# Next to the assets: MANIFEST with the hash each was rendered from, the
+# same on every machine, and LOCAL with what this machine measured and
+# chose (render times, backends, ...)
+MANIFEST = '.render-manifest.json'
+LOCAL = '.render-local.json'
+MANIFEST_KEYS = ('hash',)
+# Under MAINDIR: objects/<sha1 of the PNG>.png, one per distinct image, and
+# keys/<render key>.png linking to it, for every target to link its assets to
+STORE = '.render-store'
+INDEX = '.render-index.json'
+# Next to the SVGs with --split: <layer hash>.svg, each Baseplate layer with
+# only the drawings and definitions its exports need
+SPLIT = '.render-split'
+# optipng results by the hash of the PNG they came from, shared by every
+# tree and every build
+OPTIPNG_CACHE = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                             'render-theme-assets', 'optipng')
+SOCKET = os.path.join(os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir(),
+                      'render-theme-assets-%d.sock' % os.getuid())
+# Bumped whenever the requests a --daemon understands change
+DAEMON_PROTOCOL = 3
+
+# Every worker thread drives its own `inkscape --shell` session
+inkscape_local = threading.local()
+inkscape_shells = []
+inkscape_lock = threading.Lock()
+inkscape_timeout = 120
+output_lock = threading.Lock()
+
+# Set when rendering with --jobs > 1
+jobs = 1
+executor = None
+render_futures = []
+
+# optipng runs as its own stage, next to the Inkscape workers, with up to
+# optimize_jobs processes at once
+optimize_level = '7'
+optimize_jobs = 1
+optimizer = None
+optimize_futures = []
+# Least recently used results are dropped past this many bytes, 0 disables it
+optimize_cache_size = 64 << 20
+optimize_cache_used = None
+optimize_cache_lock = threading.Lock()
+
+# Rasterizer for each export: 'auto' picks a lightweight backend for the
+# assets it has been checked to render exactly like Inkscape
+rasterizer = 'auto'
+check_backends = False
+backend_tolerance = 16
+
+# Set by --quantize: how far apart, per channel, colours merged into one
+# palette entry may be
+quantize_tolerance = None
+
+# Where the images are shared, None with --no-store, and (render key,
+# output) of the exports to add to it once they are done
+store_dir = os.path.join(MAINDIR, STORE)
+store_queue = []
+
+# Per output directory: {png name: {'hash': ...}} of what was last rendered,
+# with the seconds its last render and optipng run took, MANIFEST and LOCAL
+# merged
+manifests = {}
+manifest_lock = threading.Lock()
+
+# Per SVG directory: {svg name: its hash and the Baseplate layers found
+# in it last time}
+indexes = {}
+index_lock = threading.Lock()
+
+# Set by --plan: (svg, context, png name, reason, manifest entry) of every
+# stale asset, collected instead of rendered
+plan = None
+
+# Assets exported since the last render_files(), by whether their pixels
+# changed; unchanged ones are left as they were
+changed_assets = []
+unchanged_assets = []
+# And what happened to every asset, by output file, for --log and the
+# slowest assets summary
+asset_log = {}
+run_started = None
+
+# With --css: {absolute path: stylesheet} of the assets the stylesheets
+# use, the absolute paths of every asset the layers render to, and of those
+# of the layers skipped because no stylesheet uses them
+used_assets = None
+layer_assets = set()
+skipped_assets = set()
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+NUMBER = re.compile(r'[-+]?(?:\d*\.\d+|\d+\.?)(?:[eE][-+]?\d+)?')
+TRANSFORM = re.compile(r'(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)')
+PATH_TOKEN = re.compile(r'[MmLlHhVvCcSsQqTtAaZz]|' + NUMBER.pattern)
+PATH_ARGS = {'M': 2, 'L': 2, 'H': 1, 'V': 1, 'C': 6, 'S': 4, 'Q': 4, 'T': 2, 'A': 7}
+
+# Outside the Baseplate layers, these only matter through references
+SKIPPED = ['sodipodi:namedview', 'metadata', 'title']
+DEFINITIONS = ['defs', 'clipPath', 'mask', 'pattern', 'symbol', 'marker',
+               'linearGradient', 'radialGradient', 'filter']
+DRAWABLES = ['path', 'rect', 'circle', 'ellipse', 'line', 'polyline',
+             'polygon', 'image', 'use', 'text', 'flowRoot']
+# Fonts and flowed text come out differently outside of Inkscape
+PLAIN_DRAWABLES = DRAWABLES[:-2]
+# A start tag, with the attribute values that may hold a '>'
+START_TAG = re.compile(rb'<[^\s/>]+(?:\s+[^\s=/>]+\s*=\s*(?:"[^"]*"|\'[^\']*\'))*\s*/?>')
+REFERENCE = re.compile(rb'url\(\s*[\'"]?#([^\s\'")]+)|href\s*=\s*["\']#([^"\']+)')
+# The same in an attribute value
+URL_REFERENCE = re.compile(r'url\(\s*[\'"]?#([^\s\'")]+)')
+
+# What Inkscape itself prints when a command or an export fails; anything
+# else on stderr, like warnings of the libraries it uses, is passed through
+INKSCAPE_ERROR = re.compile(rb'was not found|Nothing exported|Unknown option|'
+                            rb'could not find action')
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# --atlas writes atlas.png, atlas@2.png, ... and their offsets to atlas.json
+ATLAS = 'atlas'
+ASSET_NAME = re.compile(r'(.*?)(@[0-9.]+)?\.png$')
+CSS_URL = re.compile(r'''url\(\s*(["']?)([^"')]+)\1\s*\)''')
+
+
+def optimize_png(png_file):
+    # The settings a file was written with, for replace_if_changed()
+    entry = manifest_entry(png_file)
+    if quantize_tolerance is None:
+        entry.pop('quantize', None)
+    else:
+        entry['quantize'] = quantize_tolerance
+        quantize_png(png_file)
+    if os.path.exists(OPTIPNG) and optimize_level != 'none':
+        with open(png_file, 'rb') as stream:
+            key = hashlib.sha1(stream.read() + b';-o' + optimize_level.encode()).hexdigest()
+        optimized = cached_png(key)
+        if optimized is not None:
+            with open(png_file, 'wb') as stream:
+                stream.write(optimized)
+            log_asset(png_file, {'optipng': 'cached', 'optimized-bytes': len(optimized)})
+            return
+        start = time.monotonic()
+        process = subprocess.Popen([OPTIPNG, '-quiet', '-o' + optimize_level, png_file])
+        process.wait()
+        elapsed = round(time.monotonic() - start, 3)
+        manifest_entry(png_file)['optimize-time'] = elapsed
+        log_asset(png_file, {'optipng': 'run', 'optimize-time': elapsed,
+                             'optimized-bytes': os.path.getsize(png_file)})
+        if process.returncode == 0:
+            cache_png(key, png_file)
+
+
+def start_log():
+    """Forget about the assets of the last render."""
+    global run_started
+    run_started = round(time.time(), 3)
+    del changed_assets[:], unchanged_assets[:]
+    asset_log.clear()
+
+
+def quantize_png(png_file):
+    """Write png_file with a palette if it has at most 256 colours once the
+    ones within quantize_tolerance of a more common colour are merged into
+    it, and that makes the file smaller."""
+    with open(png_file, 'rb') as stream:
+        data = stream.read()
+    width, height, depth, color = struct.unpack('>IIBB', data[16:26])
+    if color == 3:
+        return
+    pixels = read_png(png_file)[2]
+    # All fully transparent pixels are the same
+    colours = [pixels[i:i+4] if pixels[i+3] else b'\0\0\0\0'
+               for i in range(0, len(pixels), 4)]
+    counts = {}
+    for colour in colours:
+        counts[colour] = counts.get(colour, 0) + 1
+    palette = []
+    index = {}
+    for colour in sorted(counts, key=counts.get, reverse=True):
+        if quantize_tolerance:
+            for number, entry in enumerate(palette):
+                if max(abs(a - b) for a, b in zip(colour, entry)) <= quantize_tolerance:
+                    index[colour] = number
+                    break
+        if colour not in index:
+            if len(palette) == 256:
+                log_asset(png_file, {'palette': None})
+                return
+            index[colour] = len(palette)
+            palette.append(colour)
+
+    # Translucent entries first, so that tRNS only needs to list those
+    order = sorted(range(len(palette)), key=lambda number: palette[number][3] == 255)
+    position = dict((number, place) for place, number in enumerate(order))
+    palette = [palette[number] for number in order]
+    bits = 1 if len(palette) <= 2 else 2 if len(palette) <= 4 else 4 if len(palette) <= 16 else 8
+    per_byte = 8 // bits
+    rows = bytearray()
+    for y in range(height):
+        rows.append(0)
+        row = [position[index[colour]] for colour in colours[y*width:(y+1)*width]]
+        for x in range(0, width, per_byte):
+            byte = 0
+            for n, value in enumerate(row[x:x+per_byte]):
+                byte |= value << (8 - bits * (n + 1))
+            rows.append(byte)
+
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data +
+                struct.pack('>I', zlib.crc32(kind + data)))
+    transparency = bytes(entry[3] for entry in palette if entry[3] != 255)
+    quantized = (PNG_SIGNATURE +
+                 chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, bits, 3, 0, 0, 0)) +
+                 chunk(b'PLTE', b''.join(entry[:3] for entry in palette)) +
+                 (chunk(b'tRNS', transparency) if transparency else b'') +
+                 chunk(b'IDAT', zlib.compress(bytes(rows), 9)) + chunk(b'IEND', b''))
+    inflated = height * (1 + (width * PNG_CHANNELS[color] * depth + 7) // 8)
+    log_asset(png_file, {'palette': len(palette), 'inflated': inflated,
+                         'quantized-bytes': len(quantized), 'quantized-inflated': len(rows)})
+    if len(quantized) < len(data):
+        with open(png_file, 'wb') as stream:
+            stream.write(quantized)
+
+
+def log_asset(outfile, fields):
+    """Add fields to the log record of an asset of the current render."""
+    with output_lock:
+        if outfile in asset_log:
+            asset_log[outfile].update(fields)
+
+
+def report_assets():
+    """Append the asset log to --log, and print the slowest exports."""
+    records = sorted(asset_log.values(), key=lambda record: record['asset'])
+    if args.log and records:
+        with open(args.log, 'a') as stream:
+            for record in records:
+                stream.write(json.dumps(record, sort_keys=True) + '\n')
+    report_quantized(records)
+    timed = [record for record in records if 'render-time' in record]
+    if not args.slowest or not timed:
+        return
+    print ('Slowest assets:')
+    timed.sort(key=lambda record: record['render-time'] + record.get('optimize-time', 0.0),
+               reverse=True)
+    for record in timed[:args.slowest]:
+        print ('  %-48s %6.2fs render %6.2fs optipng %6.2fs parse'
+               % (record['context'] + '/' + os.path.basename(record['asset']),
+                  record['render-time'], record.get('optimize-time', 0.0),
+                  record['parse-time']))
+
+
+def report_quantized(records):
+    """Print what --quantize saved on each asset it was done for."""
+    quantized = [record for record in records if 'palette' in record]
+    if not quantized:
+        return
+    print ('Quantized assets:')
+    saved = inflated = 0
+    for record in quantized:
+        name = record['context'] + '/' + os.path.basename(record['asset'])
+        if record['palette'] is None:
+            print ('  %-48s more than 256 colours' % name)
+            continue
+        print ('  %-48s %3d colours %6d -> %6d bytes %7d -> %7d inflated'
+               % (name, record['palette'], record['bytes'],
+                  min(record['bytes'], record['quantized-bytes']),
+                  record['inflated'], record['quantized-inflated']))
+        saved += max(0, record['bytes'] - record['quantized-bytes'])
+        inflated += record['inflated'] - record['quantized-inflated']
+    print ('%d of %d assets quantized, %d bytes smaller and %d bytes less to inflate'
+           % (len([record for record in quantized if record['palette'] is not None]),
+              len(quantized), saved, inflated))
+
+
+def cached_png(key):
+    """The optimized PNG cached under key, or None."""
+    if optimize_cache_size <= 0:
+        return None
+    path = os.path.join(OPTIPNG_CACHE, key + '.png')
+    try:
+        with open(path, 'rb') as stream:
+            data = stream.read()
+        # The modification time orders the cache for eviction
+        os.utime(path)
+    except OSError:
+        return None
+    return data
+
+
+def cache_png(key, png_file):
+    """Keep a copy of an optimized PNG, evicting the least recently used
+    ones once the cache grows past optimize_cache_size."""
+    global optimize_cache_used
+    if optimize_cache_size <= 0:
+        return
+    try:
+        os.makedirs(OPTIPNG_CACHE, exist_ok=True)
+        fd, temp = tempfile.mkstemp(suffix='.tmp', dir=OPTIPNG_CACHE)
+        with os.fdopen(fd, 'wb') as stream, open(png_file, 'rb') as source:
+            size = stream.write(source.read())
+        os.replace(temp, os.path.join(OPTIPNG_CACHE, key + '.png'))
+    except OSError:
+        return
+
+    with optimize_cache_lock:
+        if optimize_cache_used is not None:
+            optimize_cache_used += size
+            if optimize_cache_used <= optimize_cache_size:
+                return
+        # Sized up once per run, and again whenever it is over the limit
+        files = []
+        for name in os.listdir(OPTIPNG_CACHE):
+            try:
+                stat = os.stat(os.path.join(OPTIPNG_CACHE, name))
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, name))
+        optimize_cache_used = sum(file[1] for file in files)
+        for mtime, size, name in sorted(files):
+            if optimize_cache_used <= optimize_cache_size:
+                break
+            try:
+                os.remove(os.path.join(OPTIPNG_CACHE, name))
+            except OSError:
+                continue
+            optimize_cache_used -= size
+
+
+def queue_optimize(png_file):
+    """Hand a fresh export to the optipng stage so rendering can carry on."""
+    if optimizer is None:
+        optimize_png(png_file)
+        return
+    future = optimizer.submit(optimize_png, png_file)
+    with output_lock:
+        optimize_futures.append(future)
+
+
+class InkscapeError(Exception):
+    pass
+
+
+class InkscapeShell:
+    """An `inkscape --shell` session.
+
+    Output is read in bulk through a selector instead of byte by byte. A
+    command that does not get its prompt back within the timeout (per
+    export), or that Inkscape reports an error for, raises InkscapeError.
+    Other output on stderr is passed through. A session that died is
+    started again on the next command.
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout or inkscape_timeout
+        self.process = None
+        self.selector = None
+        # (path, mtime, size) of the SVG left open by the last action list
+        self.document = None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [INKSCAPE, '--shell'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+        self.selector = selectors.DefaultSelector()
+        self.output = {}
+        for stream in [self.process.stdout, self.process.stderr]:
+            os.set_blocking(stream.fileno(), False)
+            self.selector.register(stream, selectors.EVENT_READ)
+            self.output[stream] = b''
+        self.wait_for_prompt()
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.write(b'quit\n')
+            self.process.stdin.close()
+            self.process.wait(self.timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+        self.selector.close()
+        self.process = None
+        self.document = None
+
+    def open_document(self, path):
+        """The actions that make path the open document, and its state."""
+        stat = os.stat(path)
+        state = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        if state == self.document:
+            return '', state
+        actions = 'file-close;' if self.document is not None else ''
+        return actions + 'file-open:%s;' % path, state
+
+    def run(self, command, document=None, exports=1):
+        """Send one command line and return what Inkscape printed for it.
+
+        With a document, command is an action list for that SVG. It is
+        left open afterwards, and only opened again once it changed. The
+        timeout applies to each of the exports of the command.
+        """
+        # An action list for a whole SVG runs to tens of kilobytes
+        summary = command if len(command) <= 200 else '%s... (%d exports)' % (command[:200], exports)
+        for attempt in range(2):
+            if not self.alive():
+                self.stop()
+                self.start()
+            line = command
+            if document is not None:
+                opening, state = self.open_document(document)
+                line = opening + command
+                self.document = None
+            try:
+                self.process.stdin.write((line+'\n').encode('utf-8'))
+                self.process.stdin.flush()
+                output, errors = self.wait_for_prompt(self.timeout * exports)
+                break
+            except (OSError, InkscapeError) as error:
+                # The session crashed or hung, retry once in a fresh one
+                self.stop()
+                if attempt:
+                    raise InkscapeError('%s: %s' % (summary, error))
+        if INKSCAPE_ERROR.search(output) or INKSCAPE_ERROR.search(errors):
+            if document is not None:
+                # No telling what is open now, start over next time
+                self.stop()
+            raise InkscapeError('%s\n%s%s' % (summary, output.decode('utf-8', 'replace'),
+                                               errors.decode('utf-8', 'replace')))
+        if errors:
+            sys.stderr.write(errors.decode('utf-8', 'replace'))
+        if document is not None:
+            self.document = state
+        return output
+
+    def wait_for_prompt(self, timeout=None):
+        """Read up to the next '>' prompt and return (stdout, stderr) before it."""
+        stdout = self.process.stdout
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            # Wait for just a '>', or '\n>' if some other output came first
+            pending = self.output[stdout].rstrip(b' ')
+            if pending == b'>' or pending.endswith(b'\n>'):
+                output, errors = pending[:-1], self.output[self.process.stderr]
+                self.output[stdout] = self.output[self.process.stderr] = b''
+                return output, errors
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.process.kill()
+                raise InkscapeError('Inkscape did not answer within %ss' % timeout)
+            for key, events in self.selector.select(remaining):
+                data = os.read(key.fd, 65536)
+                if not data:
+                    self.selector.unregister(key.fileobj)
+                    if key.fileobj is stdout:
+                        self.process.kill()
+                        raise InkscapeError('Inkscape exited: %s' % (
+                            self.output[self.process.stderr].decode('utf-8', 'replace')))
+                self.output[key.fileobj] += data
+
+
+def stop_inkscape():
+    # Stopped sessions stay listed, they start again when their thread
+    # renders something
+    with inkscape_lock:
+        shells = inkscape_shells[:]
+    for shell in shells:
+        shell.stop()
+
+
+def inkscape_session():
+    shell = getattr(inkscape_local, 'shell', None)
+    if shell is None:
+        shell = inkscape_local.shell = InkscapeShell()
+        with inkscape_lock:
+            inkscape_shells.append(shell)
+    return shell
+
+
+def scale_dpi(scale):
+    return SCALE_DPI.get(scale, round(DPI * scale))
+
+
+def scale_suffix(scale):
+    return '' if scale == 1 else '@%g' % scale
+
+
+def inkscape_render_rect(icon_file, rect, output_file, dpi=DPI):
+    if args.batch is not None:
+        # --batch is for Inkscape 1.x, which has no -i/-e any more
+        inkscape_session().run(export_actions(rect, dpi, output_file).rstrip(';'),
+                               document=icon_file)
+    else:
+        inkscape_session().run('--export-dpi=%d %s -i %s -e %s' %
+                               (dpi, icon_file, rect['id'], output_file))
+    check_exported([output_file])
+
+
+def export_actions(rect, dpi, output_file):
+    """The Inkscape 1.x actions exporting rect to output_file."""
+    return ('export-id:%s;export-dpi:%d;export-filename:%s;export-do;'
+            % (rect['id'], dpi, output_file))
+
+
+def check_exported(files):
+    """Raise InkscapeError unless Inkscape wrote every one of files."""
+    missing = [file for file in files if not os.path.exists(file)]
+    if missing:
+        raise InkscapeError('Inkscape did not export %s' % ', '.join(missing))
+
+
+def crop_svg(icon_file, box, dpi):
+    """The SVG with its canvas cropped to box, like an Inkscape area export."""
+    with open(icon_file, 'rb') as stream:
+        data = stream.read()
+    start = data.index(b'<svg')
+    end = data.index(b'>', start)
+    tag = re.sub(rb'\s(width|height|viewBox)="[^"]*"', b'', data[start:end])
+    tag += (' width="%d" height="%d" viewBox="%r %r %r %r"' % (
+        int((box[2] - box[0]) * dpi / DPI + 0.5), int((box[3] - box[1]) * dpi / DPI + 0.5),
+        box[0], box[1], box[2] - box[0], box[3] - box[1])).encode('utf-8')
+    return data[:start] + tag + data[end:]
+
+
+def rsvg_render_rect(icon_file, rect, output_file, dpi=DPI):
+    subprocess.run([RSVG_CONVERT, '--format', 'png', '--output', output_file],
+                   input=crop_svg(icon_file, rect['box'], dpi), check=True)
+
+
+def cairo_render_rect(icon_file, rect, output_file, dpi=DPI):
+    cairosvg.svg2png(bytestring=crop_svg(icon_file, rect['box'], dpi),
+                     write_to=output_file)
+
+
+BACKENDS = {
+    'inkscape': inkscape_render_rect,
+    'rsvg': rsvg_render_rect,
+    'cairo': cairo_render_rect,
+}
+
+
+def fast_backend():
+    if os.path.exists(RSVG_CONVERT):
+        return 'rsvg'
+    if cairosvg is not None:
+        return 'cairo'
+    return None
+
+
+def choose_backend(rect, entry, simple, features=None):
+    """Backend for an export, and the backend to check against it if any.
+
+    A verdict holds for the features of the layer it was checked with, see
+    element_features(): edits that move or recolour the drawings keep it,
+    a layer drawn with other elements or properties is checked again.
+    """
+    if rasterizer != 'auto':
+        # Only Inkscape can export a rect that has no box to crop to
+        return rasterizer if rect['box'] is not None else 'inkscape', None
+    fast = fast_backend()
+    if fast is None or not simple:
+        return 'inkscape', None
+    if not os.path.exists(INKSCAPE):
+        return fast, None
+    checked = features is None or entry.get('backend-features') == features
+    if entry.get('backend') in [fast, 'inkscape'] and checked and not check_backends:
+        return entry['backend'], None
+    # The verdict render_asset records is for these features
+    entry.pop('backend', None)
+    if features is not None:
+        entry['backend-features'] = features
+    return 'inkscape', fast
+
+
+def read_png(path):
+    """Decode a non-interlaced PNG into (width, height, RGBA bytes)."""
+    with open(path, 'rb') as stream:
+        data = stream.read()
+    if data[:8] != PNG_SIGNATURE:
+        raise ValueError('%s is not a PNG' % path)
+    pos = 8
+    idat = b''
+    palette = transparency = b''
+    while pos < len(data):
+        length, kind = struct.unpack('>I4s', data[pos:pos+8])
+        chunk = data[pos+8:pos+8+length]
+        pos += 12 + length
+        if kind == b'IHDR':
+            width, height, depth, color, _, _, interlace = struct.unpack('>IIBBBBB', chunk)
+        elif kind == b'PLTE':
+            palette = chunk
+        elif kind == b'tRNS':
+            transparency = chunk
+        elif kind == b'IDAT':
+            idat += chunk
+        elif kind == b'IEND':
+            break
+    if interlace or color not in PNG_CHANNELS:
+        raise ValueError('%s: unsupported PNG layout' % path)
+
+    channels = PNG_CHANNELS[color]
+    bpp = max(1, channels * depth // 8)
+    stride = (width * channels * depth + 7) // 8
+    raw = zlib.decompress(idat)
+    previous = bytearray(stride)
+    samples = bytearray()
+    for y in range(height):
+        kind = raw[y * (stride + 1)]
+        line = bytearray(raw[y * (stride + 1) + 1:(y + 1) * (stride + 1)])
+        for i in range(stride):
+            left = line[i - bpp] if i >= bpp else 0
+            up = previous[i]
+            if kind == 1:
+                line[i] = (line[i] + left) & 0xff
+            elif kind == 2:
+                line[i] = (line[i] + up) & 0xff
+            elif kind == 3:
+                line[i] = (line[i] + (left + up) // 2) & 0xff
+            elif kind == 4:
+                corner = previous[i - bpp] if i >= bpp else 0
+                p = left + up - corner
+                pa, pb, pc = abs(p - left), abs(p - up), abs(p - corner)
+                line[i] = (line[i] + (left if pa <= pb and pa <= pc else
+                                      up if pb <= pc else corner)) & 0xff
+        previous = line
+        if depth == 16:
+            samples += line[0::2]
+        elif depth < 8:
+            mask = (1 << depth) - 1
+            row = [(byte >> shift) & mask for byte in line
+                   for shift in range(8 - depth, -1, -depth)][:width * channels]
+            if color != 3:
+                row = [sample * 255 // mask for sample in row]
+            samples += bytes(row)
+        else:
+            samples += line
+
+    if color == 6:
+        return width, height, bytes(samples)
+    pixels = bytearray()
+    for i in range(0, len(samples), channels):
+        if color == 0:
+            pixels += bytes([samples[i]] * 3) + b'\xff'
+        elif color == 4:
+            pixels += bytes([samples[i]] * 3 + [samples[i+1]])
+        elif color == 2:
+            pixels += samples[i:i+3] + b'\xff'
+        else:
+            index = samples[i]
+            alpha = transparency[index] if index < len(transparency) else 255
+            pixels += palette[index*3:index*3+3] + bytes([alpha])
+    return width, height, bytes(pixels)
+
+
+def write_png(path, width, height, pixels):
+    """Write RGBA pixels as a PNG, leaving the compression to optipng."""
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data +
+                struct.pack('>I', zlib.crc32(kind + data)))
+    stride = width * 4
+    rows = b''.join(b'\0' + pixels[y*stride:(y+1)*stride] for y in range(height))
+    with open(path, 'wb') as stream:
+        stream.write(PNG_SIGNATURE +
+                     chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)) +
+                     chunk(b'IDAT', zlib.compress(rows, 6)) + chunk(b'IEND', b''))
+
+
+def pixels_match(image, other, tolerance=0):
+    """Whether two decoded images differ by at most tolerance per channel."""
+    if image[:2] != other[:2]:
+        return False
+    if image[2] == other[2]:
+        return True
+    for i in range(0, len(image[2]), 4):
+        a, b = image[2][i:i+4], other[2][i:i+4]
+        if a[3] == 0 and b[3] == 0:
+            continue
+        if max(abs(x - y) for x, y in zip(a, b)) > tolerance:
+            return False
+    return True
+
+
+def export_file(output_file):
+    """Where to export output_file to: next to it when it exists, to be
+    compared with it first."""
+    if not os.path.exists(output_file):
+        return output_file
+    export = os.path.join(os.path.dirname(output_file), '.new-' + os.path.basename(output_file))
+    # Left over from a run that was interrupted, it would pass for an export
+    if os.path.exists(export):
+        os.remove(export)
+    return export
+
+
+def replace_if_changed(export, output_file):
+    """Move an export over output_file, unless it has the same pixels.
+
+    An unchanged asset keeps its file, mtime and optipng run. Returns
+    whether output_file changed.
+    """
+    if export != output_file:
+        try:
+            same = (manifest_entry(output_file).get('quantize') == quantize_tolerance and
+                    pixels_match(read_png(export), read_png(output_file),
+                                 quantize_tolerance or 0))
+        except (OSError, ValueError):
+            same = False
+        log_asset(output_file, {'bytes': os.path.getsize(export), 'changed': not same})
+        if same:
+            os.remove(export)
+            unchanged_assets.append(output_file)
+            return False
+        os.replace(export, output_file)
+    else:
+        log_asset(output_file, {'bytes': os.path.getsize(export), 'changed': True})
+    changed_assets.append(output_file)
+    return True
+
+
+def render_asset(icon_file, rect, output_file, dpi=DPI, backend='inkscape', check=None):
+    export = export_file(output_file)
+    start = time.monotonic()
+    BACKENDS[backend](icon_file, rect, export, dpi)
+    elapsed = round(time.monotonic() - start, 3)
+    manifest_entry(output_file)['render-time'] = elapsed
+    log_asset(output_file, {'render-time': elapsed, 'backend': backend,
+                            'worker': threading.current_thread().name})
+    if check is not None:
+        # Self-check: keep using the fast backend only if it gives the
+        # same pixels as Inkscape
+        fd, check_file = tempfile.mkstemp(suffix='.png', dir=os.path.dirname(output_file))
+        os.close(fd)
+        try:
+            BACKENDS[check](icon_file, rect, check_file, dpi)
+            same = pixels_match(read_png(export), read_png(check_file),
+                                backend_tolerance)
+        except (OSError, ValueError, subprocess.CalledProcessError):
+            same = False
+        finally:
+            os.remove(check_file)
+        manifest_entry(output_file)['backend'] = check if same else 'inkscape'
+    if replace_if_changed(export, output_file):
+        queue_optimize(output_file)
+
+
+def inkscape_render_batch(icon_file, exports):
+    # Inkscape 1.x action list: export every rect from the document, which
+    # the session keeps open for the next batch
+    actions = ''
+    files = [export_file(output_file) for rect, output_file, dpi in exports]
+    for (rect, output_file, dpi), export in zip(exports, files):
+        actions += export_actions(rect, dpi, export)
+    start = time.monotonic()
+    inkscape_session().run(actions.rstrip(';'), document=icon_file, exports=len(exports))
+    check_exported(files)
+    # The action list is timed as a whole, share it out evenly
+    elapsed = round((time.monotonic() - start) / len(exports), 3)
+    for (rect, output_file, dpi), export in zip(exports, files):
+        manifest_entry(output_file)['render-time'] = elapsed
+        log_asset(output_file, {'render-time': elapsed, 'backend': 'inkscape',
+                                'batch': len(exports),
+                                'worker': threading.current_thread().name})
+        if replace_if_changed(export, output_file):
+            queue_optimize(output_file)
+
+
+def render_rect(icon_file, rect, output_file, dpi=DPI, backend='inkscape', check=None):
+    """Render now, or hand the export to a worker when running with --jobs."""
+    if executor is None:
+        render_asset(icon_file, rect, output_file, dpi, backend, check)
+        return None
+    future = executor.submit(render_asset, icon_file, rect, output_file, dpi, backend, check)
+    with output_lock:
+        render_futures.append(future)
+    return future
+
+
+def render_batch(icon_file, exports):
+    """Render (rect, output_file, dpi) exports with one action list per worker.
+
+    Returns one future (or None when rendering inline) per export.
+    """
+    if not exports:
+        return []
+    if executor is None:
+        inkscape_render_batch(icon_file, exports)
+        return [None] * len(exports)
+    size = -(-len(exports) // jobs)
+    futures = []
+    for start in range(0, len(exports), size):
+        chunk = exports[start:start+size]
+        future = executor.submit(inkscape_render_batch, icon_file, chunk)
+        with output_lock:
+            render_futures.append(future)
+        futures += [future] * len(chunk)
+    return futures
+
+
+def finish_layer(lines, futures, hashes):
+    """Record a layer in the manifest and print its progress once all of
+    its exports have finished."""
+    futures = [future for future in futures if future is not None]
+    remaining = [len(futures)]
+
+    def done(future=None):
+        with output_lock:
+            remaining[0] -= 1
+            if remaining[0] > 0:
+                return
+            if not any(future.exception() for future in futures):
+                for outfile, hash in hashes:
+                    if hash is None:
+                        manifest_entry(outfile).pop('hash', None)
+                    else:
+                        manifest_entry(outfile)['hash'] = hash
+            sys.stdout.write(lines)
+            sys.stdout.flush()
+
+    if not futures:
+        done()
+    for future in futures:
+        future.add_done_callback(done)
+
+
+def pack(sizes):
+    """Shelf-pack {name: (width, height)} with a pixel between images.
+
+    Returns ({name: (x, y)}, width, height).
+    """
+    area = sum((width + 1) * (height + 1) for width, height in sizes.values())
+    limit = max([int(math.ceil(math.sqrt(area)))] + [width for width, height in sizes.values()])
+    offsets = {}
+    x = y = shelf = right = 0
+    for name in sorted(sizes, key=lambda name: (-sizes[name][1], -sizes[name][0], name)):
+        width, height = sizes[name]
+        if x and x + width > limit:
+            x, y, shelf = 0, y + shelf + 1, 0
+        offsets[name] = (x, y)
+        right = max(right, x + width)
+        x += width + 1
+        shelf = max(shelf, height)
+    return offsets, right, y + shelf
+
+
+def build_atlases(dir):
+    """Pack the assets of a context into one atlas per scale.
+
+    Their offsets go to atlas.json as {atlas: {'assets': {icon name:
+    [x, y, width, height]}, 'versions': {icon name: asset_version()},
+    ...}}. Atlases whose assets did not change are left alone. Returns the
+    paths of the atlases written.
+    """
+    scales = {}
+    for name in sorted(load_manifest(dir)):
+        match = ASSET_NAME.match(name)
+        if match and match.group(1) != ATLAS and os.path.exists(os.path.join(dir, name)):
+            scales.setdefault(match.group(2) or '', {})[match.group(1)] = os.path.join(dir, name)
+
+    offsets_file = os.path.join(dir, ATLAS + '.json')
+    try:
+        with open(offsets_file) as stream:
+            previous = json.load(stream)
+    except (OSError, ValueError):
+        previous = {}
+    atlases = {}
+    written = []
+    for suffix, assets in sorted(scales.items()):
+        atlas = ATLAS + suffix + '.png'
+        path = os.path.join(dir, atlas)
+        # Not by mtime: assets linked from the store keep the one they had there
+        versions = dict((name, asset_version(asset)) for name, asset in assets.items())
+        if previous.get(atlas, {}).get('versions') == versions and os.path.exists(path):
+            atlases[atlas] = previous[atlas]
+            continue
+
+        images = dict((name, read_png(asset)) for name, asset in assets.items())
+        offsets, width, height = pack(dict((name, image[:2]) for name, image in images.items()))
+        pixels = bytearray(width * height * 4)
+        for name, (image_width, image_height, data) in images.items():
+            x, y = offsets[name]
+            stride = image_width * 4
+            for row in range(image_height):
+                start = ((y + row) * width + x) * 4
+                pixels[start:start+stride] = data[row*stride:(row+1)*stride]
+        write_png(path, width, height, pixels)
+        atlases[atlas] = {
+            'width': width, 'height': height,
+            'assets': dict((name, list(offsets[name]) + list(images[name][:2]))
+                           for name in images),
+            'versions': versions,
+            }
+        written.append(path)
+
+    with open(offsets_file, 'w') as stream:
+        json.dump(atlases, stream, indent=1, sort_keys=True)
+        stream.write('\n')
+    return written
+
+
+def asset_version(outfile):
+    """What outfile was rendered from: its hash in the manifest, or the
+    digest of the file for assets that have none."""
+    entry = manifest_entry(outfile)
+    if 'hash' in entry:
+        return entry['hash']
+    with open(outfile, 'rb') as stream:
+        return hashlib.sha1(stream.read()).hexdigest()
+
+
+def wait_for_renders():
+    """Wait for every queued export and optipng run, raising the first error."""
+    try:
+        if executor is not None:
+            wait(render_futures)
+            for future in render_futures:
+                future.result()
+        # Every export has been queued by now, wait for optipng to catch up
+        wait(optimize_futures)
+        for future in optimize_futures:
+            future.result()
+        for key, outfile in store_queue:
+            add_to_store(key, outfile)
+    finally:
+        del render_futures[:]
+        del optimize_futures[:]
+        del store_queue[:]
+
+
+def link_or_copy(source, target):
+    """Make target a hardlink to source, or a copy across filesystems."""
+    if os.path.exists(target) and os.path.samefile(source, target):
+        return
+    temp = target + '.tmp'
+    if os.path.exists(temp):
+        os.remove(temp)
+    try:
+        os.link(source, temp)
+    except OSError:
+        shutil.copyfile(source, temp)
+    os.replace(temp, target)
+
+
+def from_store(key, outfile):
+    """Link outfile to what any target rendered for key before, if anything."""
+    if store_dir is None or key is None:
+        return False
+    stored = os.path.join(store_dir, 'keys', key + '.png')
+    if not os.path.exists(stored):
+        return False
+    link_or_copy(stored, outfile)
+    return True
+
+
+def add_to_store(key, outfile):
+    """Share a finished export through the store, and link it to an
+    identical image that is there already."""
+    with open(outfile, 'rb') as stream:
+        digest = hashlib.sha1(stream.read()).hexdigest()
+    stored = os.path.join(store_dir, 'objects', digest + '.png')
+    os.makedirs(os.path.dirname(stored), exist_ok=True)
+    if os.path.exists(stored):
+        link_or_copy(stored, outfile)
+    else:
+        link_or_copy(outfile, stored)
+    if key is not None:
+        os.makedirs(os.path.join(store_dir, 'keys'), exist_ok=True)
+        link_or_copy(stored, os.path.join(store_dir, 'keys', key + '.png'))
+
+
+def prune_store():
+    """Remove the images of the store that no manifest refers to any more.
+
+    The store keeps a list of the directories whose manifests it serves,
+    the targets of other runs included. Returns how many were removed.
+    """
+    registry = os.path.join(store_dir, 'manifests.json')
+    try:
+        with open(registry) as stream:
+            dirs = set(json.load(stream))
+    except (OSError, ValueError):
+        dirs = set()
+    loaded = dict((os.path.abspath(dir), manifest) for dir, manifest in manifests.items())
+    dirs = sorted(dir for dir in dirs | set(loaded) if os.path.isdir(dir))
+    os.makedirs(store_dir, exist_ok=True)
+    with open(registry, 'w') as stream:
+        json.dump(dirs, stream, indent=1)
+        stream.write('\n')
+
+    used = set()
+    for dir in dirs:
+        manifest = loaded.get(dir)
+        if manifest is None:
+            manifest = read_manifest(os.path.join(dir, MANIFEST))
+        used.update(entry['hash'] for entry in manifest.values() if 'hash' in entry)
+    removed = 0
+    keys = os.path.join(store_dir, 'keys')
+    for name in os.listdir(keys) if os.path.isdir(keys) else []:
+        if name[:-len('.png')] not in used:
+            os.remove(os.path.join(keys, name))
+    # Then the images nothing links to: no key and no asset
+    objects = os.path.join(store_dir, 'objects')
+    for name in os.listdir(objects) if os.path.isdir(objects) else []:
+        if os.stat(os.path.join(objects, name)).st_nlink == 1:
+            os.remove(os.path.join(objects, name))
+            removed += 1
+    return removed
+
+
+def read_manifest(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_manifest(dir):
+    with manifest_lock:
+        if dir not in manifests:
+            manifest = read_manifest(os.path.join(dir, MANIFEST))
+            for name, entry in read_manifest(os.path.join(dir, LOCAL)).items():
+                manifest.setdefault(name, {}).update(entry)
+            manifests[dir] = manifest
+        return manifests[dir]
+
+
+def manifest_entry(outfile):
+    manifest = load_manifest(os.path.dirname(outfile))
+    with manifest_lock:
+        return manifest.setdefault(os.path.basename(outfile), {})
+
+
+def print_plan():
+    """Print the stale assets found by --plan with the time they should take.
+
+    Assets that were never timed are estimated from the average of the ones
+    that were.
+    """
+    averages = {}
+    for key in ('render-time', 'optimize-time'):
+        times = [entry[key] for manifest in manifests.values()
+                 for entry in manifest.values() if key in entry]
+        averages[key] = sum(times) / len(times) if times else 0.0
+    optimizing = optimizer is not None
+    totals = {'render-time': 0.0, 'optimize-time': 0.0}
+    last = (None, None)
+    for svg, context, name, reason, entry in sorted(plan, key=lambda item: item[:3]):
+        if svg != last[0]:
+            print (svg)
+        if (svg, context) != last:
+            print ('  %s/' % context)
+        last = (svg, context)
+        estimate = {key: entry.get(key, averages[key]) for key in totals}
+        if not optimizing:
+            estimate['optimize-time'] = 0.0
+        for key in totals:
+            totals[key] += estimate[key]
+        print ('    %-48s %-7s %6.2fs render %6.2fs optipng'
+               % (name, reason, estimate['render-time'], estimate['optimize-time']))
+    optimizers = optimize_jobs if optimizing else 1
+    print ('%d assets to render, about %.1fs with %d jobs and %.1fs of optipng with %d jobs'
+           % (len(plan), totals['render-time'] / jobs, jobs,
+              totals['optimize-time'] / optimizers, optimizers))
+
+
+def save_manifests():
+    with manifest_lock:
+        for dir, manifest in manifests.items():
+            shared = {}
+            local = {}
+            for name, entry in manifest.items():
+                for content, keep in [(shared, True), (local, False)]:
+                    part = dict((key, value) for key, value in entry.items()
+                                if (key in MANIFEST_KEYS) == keep)
+                    if part:
+                        content[name] = part
+            for path, content in [(os.path.join(dir, MANIFEST), shared),
+                                  (os.path.join(dir, LOCAL), local)]:
+                text = json.dumps(content, indent=1, sort_keys=True) + '\n'
+                try:
+                    with open(path) as file:
+                        if file.read() == text:
+                            continue
+                except OSError:
+                    pass
+                with open(path, 'w') as file:
+                    file.write(text)
+
+
+def load_index(file):
+    path = os.path.join(os.path.dirname(file), INDEX)
+    with index_lock:
+        if path not in indexes:
+            try:
+                with open(path) as stream:
+                    indexes[path] = json.load(stream)
+            except (OSError, ValueError):
+                indexes[path] = {}
+        return indexes[path].get(os.path.basename(file), {})
+
+
+def save_index(file, hash, layers):
+    path = os.path.join(os.path.dirname(file), INDEX)
+    load_index(file)
+    with index_lock:
+        indexes[path][os.path.basename(file)] = {'hash': hash, 'layers': layers}
+        with open(path, 'w') as stream:
+            json.dump(indexes[path], stream, indent=1, sort_keys=True)
+            stream.write('\n')
+
+
+def split_path(file, layer_hash):
+    return os.path.join(os.path.dirname(file), SPLIT, layer_hash + '.svg')
+
+
+def write_split(file, layer_hash, data):
+    """Write the split document of a layer of file, unless it is there
+    already. Returns whether the layer has one."""
+    if data is None:
+        return False
+    path = split_path(file, layer_hash)
+    try:
+        with open(path, 'rb') as stream:
+            if stream.read() == data:
+                return True
+    except OSError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as stream:
+        stream.write(data)
+    return True
+
+
+def prune_splits():
+    """Remove the split documents that no indexed layer uses any more."""
+    with index_lock:
+        used = dict((os.path.join(os.path.dirname(path), SPLIT),
+                     set(layer['hash'] + '.svg' for indexed in index.values()
+                         for layer in indexed.get('layers', []) if layer.get('hash')))
+                    for path, index in indexes.items())
+    for dir, names in used.items():
+        if os.path.isdir(dir):
+            for name in set(os.listdir(dir)) - names:
+                os.remove(os.path.join(dir, name))
+
+
+def number(value, default=0.0):
+    match = NUMBER.match((value or '').strip())
+    return float(match.group()) if match else default
+
+
+def style_value(attrs, key):
+    for item in attrs.get('style', '').split(';'):
+        if item.partition(':')[0].strip() == key:
+            return item.partition(':')[2].strip()
+    return attrs.get(key)
+
+
+def element_features(name, attrs):
+    """What an element is drawn with, but not where or in which colour: its
+    name and the names of its attributes and style properties, marked with
+    a # when they refer to another element."""
+    items = [(key, value) for key, value in attrs.items() if key != 'style']
+    items += [(item.partition(':')[0].strip(), item.partition(':')[2])
+              for item in attrs.get('style', '').split(';') if ':' in item]
+    return (name,) + tuple(sorted(key + '#' if URL_REFERENCE.search(value) or
+                                  value.startswith('#') else key
+                                  for key, value in items))
+
+
+def multiply(m, n):
+    a, b, c, d, e, f = m
+    return (a*n[0] + c*n[1], b*n[0] + d*n[1],
+            a*n[2] + c*n[3], b*n[2] + d*n[3],
+            a*n[4] + c*n[5] + e, b*n[4] + d*n[5] + f)
+
+
+def parse_transform(text, matrix=IDENTITY):
+    """Apply an SVG transform attribute to matrix, None if unparseable."""
+    try:
+        for kind, values in TRANSFORM.findall(text or ''):
+            v = [float(x) for x in NUMBER.findall(values)]
+            if kind == 'matrix':
+                t = tuple(v[:6])
+            elif kind == 'translate':
+                t = (1, 0, 0, 1, v[0], v[1] if len(v) > 1 else 0)
+            elif kind == 'scale':
+                t = (v[0], 0, 0, v[1] if len(v) > 1 else v[0], 0, 0)
+            elif kind == 'rotate':
+                cos, sin = math.cos(math.radians(v[0])), math.sin(math.radians(v[0]))
+                t = (cos, sin, -sin, cos, 0, 0)
+                if len(v) == 3:
+                    t = multiply(multiply((1, 0, 0, 1, v[1], v[2]), t),
+                                 (1, 0, 0, 1, -v[1], -v[2]))
+            elif kind == 'skewX':
+                t = (1, 0, math.tan(math.radians(v[0])), 1, 0, 0)
+            else:
+                t = (1, math.tan(math.radians(v[0])), 0, 1, 0, 0)
+            matrix = multiply(matrix, t)
+    except (IndexError, TypeError):
+        return None
+    return matrix if len(matrix) == 6 else None
+
+
+def path_points(d):
+    """End and control points of a path, whose hull contains the path."""
+    points = []
+    x = y = start_x = start_y = 0.0
+    control = None
+    command = None
+    tokens = PATH_TOKEN.findall(d)
+    i = 0
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            command = tokens[i]
+            i += 1
+            if command in 'Zz':
+                x, y = start_x, start_y
+                control = None
+                continue
+        if command is None or command in 'Zz':
+            return None
+        upper = command.upper()
+        args = [float(token) for token in tokens[i:i+PATH_ARGS[upper]]]
+        i += PATH_ARGS[upper]
+        if len(args) < PATH_ARGS[upper]:
+            return None
+        dx, dy = (x, y) if command.islower() else (0.0, 0.0)
+        if upper == 'H':
+            x = args[0] + dx
+            pairs = [(x, y)]
+        elif upper == 'V':
+            y = args[0] + dy
+            pairs = [(x, y)]
+        elif upper == 'A':
+            # An arc stays within its diameter of either endpoint
+            r = 2 * max(abs(args[0]), abs(args[1]))
+            end_x, end_y = args[5] + dx, args[6] + dy
+            pairs = [(px + ox, py + oy) for px, py in [(x, y), (end_x, end_y)]
+                     for ox, oy in [(-r, -r), (r, r)]] + [(end_x, end_y)]
+        else:
+            pairs = [(args[j] + dx, args[j+1] + dy) for j in range(0, len(args), 2)]
+            if upper in 'ST' and control is not None:
+                pairs.insert(0, (2*x - control[0], 2*y - control[1]))
+        points += pairs
+        x, y = pairs[-1]
+        control = pairs[-2] if upper in 'CSQT' and len(pairs) > 1 else None
+        if upper == 'M':
+            start_x, start_y = x, y
+            command = 'l' if command == 'm' else 'L'
+    return points
+
+
+def element_box(name, attrs):
+    """Local (x0, y0, x1, y1) of a drawable, or None when it is unknown."""
+    if name in ['rect', 'image']:
+        x, y = number(attrs.get('x')), number(attrs.get('y'))
+        points = [(x, y), (x + number(attrs.get('width')),
+                           y + number(attrs.get('height')))]
+    elif name in ['circle', 'ellipse']:
+        cx, cy = number(attrs.get('cx')), number(attrs.get('cy'))
+        rx = number(attrs.get('rx', attrs.get('r')))
+        ry = number(attrs.get('ry', attrs.get('r')))
+        points = [(cx - rx, cy - ry), (cx + rx, cy + ry)]
+    elif name == 'line':
+        points = [(number(attrs.get('x1')), number(attrs.get('y1'))),
+                  (number(attrs.get('x2')), number(attrs.get('y2')))]
+    elif name in ['polyline', 'polygon']:
+        values = [float(v) for v in NUMBER.findall(attrs.get('points', ''))]
+        points = list(zip(values[0::2], values[1::2]))
+    elif name == 'path':
+        points = path_points(attrs.get('d', ''))
+    else:
+        points = None
+    if not points:
+        return None
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def transform_box(matrix, box):
+    if matrix is None or box is None:
+        return None
+    a, b, c, d, e, f = matrix
+    corners = [(a*x + c*y + e, b*x + d*y + f)
+               for x in (box[0], box[2]) for y in (box[1], box[3])]
+    xs = [p[0] for p in corners]
+    ys = [p[1] for p in corners]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def overlaps(box, other):
+    return (box is None or other is None or
+            (box[0] <= other[2] and other[0] <= box[2] and
+             box[1] <= other[3] and other[1] <= box[3]))
+
+
+class SvgWatcher:
+    """Report the SVGs of a directory that get written to.
+
+    Uses inotify through libc when it is available, and compares
+    modification times every interval seconds otherwise.
+    """
+
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_TO = 0x80
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, dir, interval=0.5):
+        self.dir = dir
+        self.interval = interval
+        self.fd = None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(os.O_CLOEXEC)
+            if fd >= 0:
+                if libc.inotify_add_watch(fd, os.fsencode(dir),
+                                          self.IN_CLOSE_WRITE | self.IN_MOVED_TO) >= 0:
+                    self.fd = fd
+                else:
+                    os.close(fd)
+        except (OSError, AttributeError):
+            pass
+        self.mtimes = self.scan()
+
+    def scan(self):
+        mtimes = {}
+        for name in os.listdir(self.dir):
+            if name[-4:] == '.svg':
+                try:
+                    mtimes[name] = os.stat(os.path.join(self.dir, name)).st_mtime_ns
+                except OSError:
+                    pass
+        return mtimes
+
+    def read_events(self, timeout):
+        """Names of the SVGs inotify reports within timeout seconds."""
+        names = set()
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return names
+        data = os.read(self.fd, 65536)
+        pos = 0
+        while pos < len(data):
+            wd, mask, cookie, length = self.EVENT.unpack_from(data, pos)
+            pos += self.EVENT.size
+            name = os.fsdecode(data[pos:pos+length].rstrip(b'\0'))
+            pos += length
+            if name[-4:] == '.svg':
+                names.add(name)
+        return names
+
+    def changed(self):
+        """Block until SVGs have been saved and return their paths."""
+        while True:
+            if self.fd is not None:
+                names = self.read_events(None)
+                # Editors may save in several writes, take them all in at once
+                while True:
+                    more = self.read_events(0.1)
+                    if not more:
+                        break
+                    names |= more
+            else:
+                time.sleep(self.interval)
+                mtimes = self.scan()
+                names = set(name for name, mtime in mtimes.items()
+                            if self.mtimes.get(name) != mtime)
+                self.mtimes = mtimes
+            if names:
+                return sorted(os.path.join(self.dir, name) for name in names)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def watch(files=None, filter=None):
+    """Render files (the names of SVGs in SRC, all of them by default) again
+    whenever they are saved, until interrupted.
+
+    The Inkscape sessions, the layer index and the manifests stay loaded
+    between saves, and only the layers whose hash changed are exported.
+    """
+    watcher = SvgWatcher(SRC)
+    print ('Watching', SRC, 'for changes', '(inotify)' if watcher.fd is not None
+           else '(polling every %ss)' % watcher.interval)
+    sys.stdout.flush()
+    try:
+        while True:
+            for file in watcher.changed():
+                if files is not None and os.path.basename(file) not in files:
+                    continue
+                if not os.path.exists(file):
+                    continue
+                before = dict(((layer['context'], layer['icon-name']), layer['hash'])
+                              for layer in load_index(file).get('layers', []))
+                start = time.monotonic()
+                start_log()
+                try:
+                    render_file(file, filter=filter)
+                    wait_for_renders()
+                    report_assets()
+                    if args.split:
+                        prune_splits()
+                except (xml.parsers.expat.ExpatError, InkscapeError, OSError,
+                        subprocess.CalledProcessError) as error:
+                    # Most likely saved halfway, the next save will do
+                    print ('Error rendering %s: %s' % (file, error))
+                    continue
+                finally:
+                    save_manifests()
+                after = load_index(file).get('layers', [])
+                changed = [layer for layer in after
+                           if before.get((layer['context'], layer['icon-name'])) != layer['hash']
+                           or layer['hash'] is None]
+                print ('%s: %d of %d layers changed, %d assets (%.2fs)'
+                       % (file, len(changed), len(after), len(changed_assets),
+                          time.monotonic() - start))
+                sys.stdout.flush()
+    finally:
+        watcher.close()
+
+
+class ClientOutput:
+    """Stands in for sys.stdout while a daemon renders for a client, and
+    forwards everything written to the client."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.gone = False
+
+    def send(self, message):
+        with self.lock:
+            if self.gone:
+                return
+            try:
+                self.stream.write(json.dumps(message).encode('utf-8') + b'\n')
+                self.stream.flush()
+            except OSError:
+                # The client went away, finish its render all the same
+                self.gone = True
+
+    def write(self, text):
+        if text:
+            self.send({'output': text})
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def serve_request(connection):
+    """Render what a client asked for with the warm Inkscape sessions."""
+    stream = connection.makefile('rwb')
+    output = ClientOutput(stream)
+    try:
+        request = json.loads(stream.readline() or 'null')
+    except ValueError:
+        request = None
+    if not isinstance(request, dict):
+        return
+    if request.get('protocol') != DAEMON_PROTOCOL:
+        output.send({'error': 'protocol %s is not supported' % request.get('protocol')})
+        return
+
+    stdout = sys.stdout
+    sys.stdout = output
+    status = 1
+    try:
+        options = parser.parse_args(request['argv'])
+        options.source_dir = request['source-dir']
+        options.output_dir = request['output-dir']
+        options.store = request.get('store')
+        options.log = request.get('log')
+        options.stylesheets = request.get('stylesheets')
+        configure(options)
+        # The client's job counts, not the ones the daemon started with
+        start_workers(options.jobs, options.optimize_jobs)
+        # The outputs may have changed since the last request
+        with manifest_lock:
+            manifests.clear()
+        with index_lock:
+            indexes.clear()
+        status = render_files()
+    except SystemExit as exit:
+        status = exit.code
+    except Exception:
+        traceback.print_exc(file=sys.stdout)
+    finally:
+        sys.stdout = stdout
+        save_manifests()
+    output.send({'status': status})
+
+
+def serve(path):
+    """Serve renders on the Unix socket at path until interrupted."""
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX)
+        try:
+            probe.connect(path)
+        except OSError:
+            # Left behind by a daemon that did not exit cleanly
+            os.remove(path)
+        else:
+            print ('A render daemon is already listening on', path)
+            return 1
+        finally:
+            probe.close()
+    server = socket.socket(socket.AF_UNIX)
+    # Created 0600 rather than changed to it after bind(), the socket may
+    # be in /tmp where anyone could connect in between
+    umask = os.umask(0o177)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(umask)
+    server.listen()
+    print ('Render daemon listening on', path)
+    sys.stdout.flush()
+    try:
+        while True:
+            connection, address = server.accept()
+            with connection:
+                serve_request(connection)
+    finally:
+        server.close()
+        os.remove(path)
+    return 0
+
+
+def render_in_daemon(argv):
+    """Have a running --daemon render argv and return its exit status, or
+    None to render in this process when no daemon finishes the job."""
+    if not os.path.exists(args.socket):
+        return None
+    client = socket.socket(socket.AF_UNIX)
+    try:
+        client.connect(args.socket)
+    except OSError:
+        client.close()
+        return None
+    request = {'protocol': DAEMON_PROTOCOL, 'argv': argv,
+               'source-dir': os.path.abspath(SRC), 'output-dir': os.path.abspath(MAINDIR),
+               'store': args.store and os.path.abspath(args.store),
+               'log': args.log and os.path.abspath(args.log),
+               'stylesheets': [os.path.abspath(stylesheet) for stylesheet in args.stylesheets]}
+    try:
+        with client:
+            client.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            for line in client.makefile('rb'):
+                message = json.loads(line)
+                if 'output' in message:
+                    sys.stdout.write(message['output'])
+                    sys.stdout.flush()
+                elif 'status' in message:
+                    return message['status']
+                else:
+                    print ('Render daemon:', message.get('error'))
+                    break
+    except (OSError, ValueError):
+        pass
+    print ('The render daemon did not finish, rendering here')
+    return None
+
+
+def configure(options):
+    """Apply the command line options that can change between renders."""
+    global args, SRC, MAINDIR, optimize_level, optimize_cache_size, inkscape_timeout
+    global rasterizer, check_backends, backend_tolerance, store_dir, quantize_tolerance
+    args = options
+    SRC = options.source_dir
+    MAINDIR = options.output_dir
+    optimize_level = options.optimize_level
+    optimize_cache_size = int(options.optipng_cache_size * (1 << 20))
+    inkscape_timeout = options.timeout
+    rasterizer = options.backend
+    check_backends = options.check_backends
+    backend_tolerance = options.backend_tolerance
+    quantize_tolerance = options.quantize_tolerance if options.quantize else None
+    store_dir = None if options.no_store else options.store or os.path.join(MAINDIR, STORE)
+
+
+def render_files():
+    """Render args.file, or every SVG in SRC, and wait for all of it.
+
+    Returns the exit status.
+    """
+    if args.file is None:
+        if plan is None and not os.path.exists(MAINDIR):
+            os.mkdir(MAINDIR)
+        print ('Planning' if plan is not None else 'Rendering', 'from SVGs in', SRC)
+        files = [os.path.join(SRC, file) for file in os.listdir(SRC)
+                 if file[-4:] == '.svg']
+        render_svgs(files, [MAINDIR] * len(files))
+    else:
+        file = os.path.join(SRC, args.file + '.svg')
+        if not os.path.exists(file):
+            print ("Error: No such file", file)
+            return 1
+        render_svgs([file], [MAINDIR], True, filter=args.icons or None)
+    return 0
+
+
+def css_assets(stylesheets):
+    """{absolute path: stylesheet} of the PNGs the stylesheets use."""
+    assets = {}
+    for stylesheet in stylesheets:
+        with open(stylesheet) as stream:
+            css = stream.read()
+        for match in CSS_URL.finditer(css):
+            url = match.group(2)
+            if ':' not in url and url.endswith('.png'):
+                path = os.path.join(os.path.dirname(os.path.abspath(stylesheet)), url)
+                assets.setdefault(os.path.normpath(path), stylesheet)
+    return assets
+
+
+def report_css(complete):
+    """Print the assets the stylesheets use that are missing, if the layers
+    of every SVG were seen, and the ones rendered before that they do not
+    use."""
+    used = set(used_assets)
+    print ('%s use %d assets, the SVGs render %d of them'
+           % (', '.join(args.stylesheets), len(used), len(used & layer_assets)))
+    # The others are in the theme as they are
+    missing = sorted(asset for asset in used - layer_assets
+                     if not os.path.exists(asset)) if complete else []
+    if missing:
+        print ('Used but missing, no layer renders them:')
+        for asset in missing:
+            print ('  %s (%s)' % (os.path.relpath(asset), used_assets[asset]))
+    unused = sorted(asset for asset in skipped_assets if os.path.exists(asset))
+    if unused:
+        print ('Rendered but not used by any stylesheet:')
+        for asset in unused:
+            print ('  %s' % os.path.relpath(asset))
+
+
+def render_svgs(files, targets, force=False, filter=None):
+    """Render files, each into the output directory at the same place in
+    targets, and wait for all of it."""
+    global used_assets
+    start_log()
+    used_assets = css_assets(args.stylesheets) if args.css else None
+    layer_assets.clear()
+    skipped_assets.clear()
+    if executor is None or len(files) < 2:
+        for file, target in zip(files, targets):
+            render_file(file, target, force, filter)
+    else:
+        # Parse every SVG at once so all workers are fed from the start
+        with ThreadPoolExecutor(len(files)) as parsers:
+            for parsed in [parsers.submit(render_file, file, target, force, filter)
+                           for file, target in zip(files, targets)]:
+                parsed.result()
+
+    wait_for_renders()
+    if changed_assets or unchanged_assets:
+        print ('%d of %d rendered assets changed'
+               % (len(changed_assets), len(changed_assets) + len(unchanged_assets)))
+    report_assets()
+    if used_assets is not None:
+        report_css(filter is None and args.file is None)
+    if args.split and plan is None:
+        prune_splits()
+    if store_dir is not None and plan is None:
+        removed = prune_store()
+        if removed:
+            print ('Removed %d unused images from the store' % removed)
+    if args.atlas and plan is None:
+        for dir in list(manifests):
+            for atlas in build_atlases(dir):
+                print ('Packed', atlas)
+                queue_optimize(atlas)
+        wait_for_renders()
+
+
+def render(svgs, targets, scales=[1, 2], jobs=1, force=False, icons=None, **options):
+    """Render the assets of the SVG files svgs into targets, the output
+    directory of all of them or a list with one for each.
+
+    Only the stale assets are rendered, or all of them with force, and only
+    those of the icon names in icons if given. options are any other
+    command line options, e.g. batch='layer' or no_store=True. Returns the
+    number of assets whose pixels changed.
+    """
+    if isinstance(targets, str):
+        targets = [targets] * len(svgs)
+    defaults = vars(parser.parse_args([]))
+    for name in options:
+        if name not in defaults:
+            raise TypeError('render() got an unexpected option %r' % name)
+    defaults.update(options, scale=list(scales), jobs=jobs, output_dir=targets[0])
+    configure(argparse.Namespace(**defaults))
+    if args.css and not args.stylesheets:
+        raise ValueError('render() needs stylesheets to take the assets from with css')
+    start_workers(jobs, args.optimize_jobs)
+    for target in set(targets):
+        os.makedirs(target, exist_ok=True)
+    render_svgs(svgs, targets, force, icons or None)
+    save_manifests()
+    return len(changed_assets)
+
+
+def start_workers(count, optimize_count=0):
+    """Make room for count Inkscape sessions and optimize_count optipng
+    processes at once, 0 meaning one per CPU."""
+    global jobs, executor, optimize_jobs, optimizer
+    count = count if count > 0 else os.cpu_count() or 1
+    if count != jobs:
+        # The sessions belong to the threads of the old pool
+        if executor is not None:
+            executor.shutdown()
+            executor = None
+            stop_inkscape()
+        jobs = count
+        if jobs > 1:
+            executor = ThreadPoolExecutor(jobs)
+    optimize_count = optimize_count if optimize_count > 0 else os.cpu_count() or 1
+    if optimizer is not None and optimize_jobs != optimize_count:
+        optimizer.shutdown()
+        optimizer = None
+    optimize_jobs = optimize_count
+    if optimizer is None and optimize_level != 'none' and os.path.exists(OPTIPNG):
+        optimizer = ThreadPoolExecutor(optimize_jobs)
+
+
+def close():
+    """Stop the worker pools and the Inkscape sessions, and save what was
+    rendered to the manifests."""
+    global jobs, executor, optimize_jobs, optimizer
+    if executor is not None:
+        executor.shutdown(cancel_futures=True)
+    if optimizer is not None:
+        optimizer.shutdown(cancel_futures=True)
+    jobs, executor, optimize_jobs, optimizer = 1, None, 1, None
+    stop_inkscape()
+    if plan is None:
+        save_manifests()
+
+
+class LayerRenderer:
+    """Queue the exports of the stale assets of an SVG's layers, as found
+    by a ContentHandler, into output_dir."""
+
+    def __init__(self, path, output_dir, force=False, filter=None, batch=None, scales=[1],
+                 split=False):
+        self.path = path
+        self.output_dir = output_dir
+        self.force = force
+        self.filter = filter
+        self.scales = scales
+        self.batch = batch
+        self.batch_layers = []
+        self.batch_exports = []
+        self.batch_document = path
+        self.split = split
+        # For the asset log: how long the SVG took to parse, if it was not
+        # found unchanged in the index
+        self.parse_time = 0.0
+        self.indexed = False
+
+    def render(self, layers):
+        # Layers of a parse that stopped early have no hash to check
+        for layer in layers:
+            document = self.path
+            if self.split and layer.get('split'):
+                if os.path.exists(split_path(self.path, layer['hash'])):
+                    document = split_path(self.path, layer['hash'])
+            self.render_layer(layer['context'], layer['icon-name'],
+                              layer['rects'], layer.get('hash'),
+                              layer.get('simple', False), layer.get('features'), document)
+        self.flush_batch()
+
+    def render_layer(self, context, icon_name, rects, layer_hash, simple, features, document):
+        if self.filter is not None and not icon_name in self.filter:
+            return
+        if used_assets is not None:
+            # Every scale of the layers whose assets a stylesheet uses
+            outfiles = [os.path.abspath(os.path.join(self.output_dir, context,
+                                                     icon_name + scale_suffix(scale) + '.png'))
+                        for scale in self.scales]
+            used = any(outfile in used_assets for outfile in outfiles)
+            with output_lock:
+                layer_assets.update(outfiles)
+                if not used:
+                    skipped_assets.update(outfiles)
+            if not used:
+                return
+
+        marks = ''
+        exports = []
+        hashes = []
+        for scale, rect in itertools.product(self.scales, rects):
+            width = rect['width']
+            height = rect['height']
+            id = rect['id']
+            dpi = scale_dpi(scale)
+            hash = None
+            if layer_hash is not None:
+                key = '%s;dpi=%d' % (layer_hash, dpi)
+                if quantize_tolerance is not None:
+                    key += ';quantize=%d' % quantize_tolerance
+                hash = hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+            dir = os.path.join(self.output_dir, context)
+            outfile = os.path.join(dir, icon_name+scale_suffix(scale)+'.png')
+            if plan is None and not os.path.exists(dir):
+                os.makedirs(dir, exist_ok=True)
+            hashes.append((outfile, hash))
+            entry = manifest_entry(outfile)
+            reason = self.stale_reason(outfile, hash, entry)
+            if plan is None:
+                with output_lock:
+                    asset_log[outfile] = {
+                        'asset': outfile, 'svg': self.path, 'context': context,
+                        'icon-name': icon_name, 'scale': scale, 'reason': reason,
+                        'parse-time': self.parse_time, 'indexed': self.indexed,
+                        'started': run_started, 'result': 'up-to-date',
+                        }
+            if reason is None:
+                marks += '-'
+            elif plan is not None:
+                with output_lock:
+                    plan.append((self.path, context, os.path.basename(outfile),
+                                 reason, entry))
+            elif not self.force and from_store(hash, outfile):
+                log_asset(outfile, {'result': 'store'})
+                marks += '='
+            else:
+                log_asset(outfile, {'result': 'rendered'})
+                # Exports replace the asset rather than write into it, so a
+                # file the store shares with other targets is left alone
+                exports.append((rect, outfile, dpi) + choose_backend(rect, entry, simple, features))
+                if store_dir is not None:
+                    with output_lock:
+                        store_queue.append((hash, outfile))
+                marks += '.'
+        if plan is None:
+            self.queue_layer('%s %s\n%s\n' % (context, icon_name, marks),
+                             exports, hashes, document)
+
+    def stale_reason(self, outfile, hash, entry):
+        """Return why outfile has to be rendered, or None if it is up to date."""
+        if self.force:
+            return 'forced'
+        if not os.path.exists(outfile):
+            return 'missing'
+        # Do a hash based check, and a time based one for outputs
+        # that are not in the manifest yet
+        if hash is not None and 'hash' in entry:
+            return 'hash' if entry['hash'] != hash else None
+        if os.stat(self.path).st_mtime > os.stat(outfile).st_mtime:
+            return 'mtime'
+        return None
+
+    def queue_layer(self, lines, exports, hashes, document):
+        # Only plain Inkscape exports go into batches
+        batched = [export[:3] for export in exports
+                   if self.batch is not None and export[3:] == ('inkscape', None)]
+        futures = [render_rect(document, *export) for export in exports
+                   if export[:3] not in batched]
+        if self.batch is None:
+            finish_layer(lines, futures, hashes)
+            return
+        # A batch exports from one document, split layers each have their own
+        if batched and document != self.batch_document:
+            self.flush_batch()
+            self.batch_document = document
+        self.batch_layers.append((lines, futures, len(batched), hashes))
+        self.batch_exports += batched
+        if self.batch == 'layer':
+            self.flush_batch()
+
+    def flush_batch(self):
+        futures = render_batch(self.batch_document, self.batch_exports)
+        for lines, single, count, hashes in self.batch_layers:
+            finish_layer(lines, single + futures[:count], hashes)
+            futures = futures[count:]
+        self.batch_layers = []
+        self.batch_exports = []
+
+
+class StopParsing(Exception):
+    pass
+
+
+class ContentHandler:
+    """Find the Baseplate layers of an SVG, with the hash of everything
+    their exports depend on and, with split, the document each of them can
+    be rendered from on its own. Only parses, the rendering is up to a
+    LayerRenderer."""
+    ROOT = 0
+    SVG = 1
+    LAYER = 2
+    OTHER = 3
+    TEXT = 4
+
+    def __init__(self, data, filter=None, split=False):
+        self.stack = [self.ROOT]
+        self.inside = [self.ROOT]
+        self.data = data
+        self.rects = []
+        self.state = self.ROOT
+        self.chars = ""
+        self.filter = filter
+        self.layers = []
+        self.found = set()
+
+        # What each export depends on: the Baseplate layer itself, every
+        # drawing that overlaps its rects, everything in <defs> and the
+        # drawings any of those refer to by id
+        self.regions = [None]
+        self.matrices = [IDENTITY]
+        self.strokes = [1.0]
+        self.filtered = [False]
+        self.scopes = [b'']
+        self.definitions = hashlib.sha1()
+        self.drawings = []
+        self.digest = None
+        self.references = set()
+        # The element_features() of the current layer or drawing, and of
+        # the definitions
+        self.kinds = set()
+        self.definition_kinds = set()
+        self.definition_references = set()
+        # {id: numbers of the drawings that element is or holds}
+        self.drawing_ids = {}
+        self.elements = [(None, 0)]
+
+        # With split, the byte ranges to cut the layers out with: (start, end
+        # of the start tag, name) of the open elements, and the ranges of the
+        # drawings and definitions, by id for the ones that have one
+        self.split = split
+        self.tags = []
+        self.pieces = []
+        self.referable = {}
+
+    def parse(self):
+        """Parse data into layers, or up to StopParsing once every icon of
+        the filter was found."""
+        self.parser = xml.parsers.expat.ParserCreate()
+        self.parser.StartElementHandler = self.startElement
+        self.parser.EndElementHandler = self.endElement
+        self.parser.CharacterDataHandler = self.characters
+        self.parser.Parse(self.data, True)
+        self.endDocument()
+
+    def endDocument(self):
+        for layer in self.layers:
+            ancestors = layer.pop('ancestors')
+            drawings = self.referenced(self.related(layer['rects']),
+                                       layer.pop('references') | self.definition_references)
+            related = sorted(set((digest, plain) for box, digest, plain, piece, ids, kinds
+                                 in drawings))
+            layer['hash'] = self.layer_hash(layer.pop('digest'), related)
+            layer['simple'] = (all(plain for drawing, plain in related) and
+                               all(rect['box'] for rect in layer['rects']))
+            kinds = layer.pop('kinds').union(self.definition_kinds,
+                                             *[drawing[5] for drawing in drawings])
+            layer['features'] = hashlib.sha1(repr(sorted(kinds)).encode('utf-8')).hexdigest()
+            if self.split:
+                layer['document'] = self.split_document(
+                    layer, ancestors, [drawing[3] for drawing in drawings])
+
+    def offset(self):
+        """Byte offset of the current parser event in the document."""
+        # Line and column would count characters, not bytes
+        return self.parser.CurrentByteIndex
+
+    def end_offset(self):
+        """Byte offset just past the element the current event ends."""
+        offset = self.offset()
+        if self.data.startswith(b'</', offset):
+            return self.data.index(b'>', offset) + 1
+        # An empty element ends with its start tag, right before the event
+        return offset
+
+    def related(self, rects):
+        """The drawings that overlap any of rects."""
+        boxes = [rect['box'] for rect in rects]
+        return [drawing for drawing in self.drawings
+                if any(overlaps(drawing[0], rect) for rect in boxes)]
+
+    def referenced(self, drawings, references):
+        """drawings, and the drawings they or references refer to by id, a
+        <use> clones another drawing for example."""
+        drawings = list(drawings)
+        pending = set(references).union(*[drawing[4] for drawing in drawings])
+        seen = set()
+        while pending:
+            id = pending.pop()
+            if id in seen:
+                continue
+            seen.add(id)
+            for number in self.drawing_ids.get(id, []):
+                drawing = self.drawings[number]
+                if drawing not in drawings:
+                    drawings.append(drawing)
+                    pending.update(drawing[4])
+        return drawings
+
+    def split_document(self, layer, ancestors, pieces):
+        """The layer, inside its ancestors, and pieces, the (ancestors,
+        start, end) of the drawings it overlaps, as a document of their own
+        with the definitions and drawings they use.
+
+        Returns None when they refer to any other element, those layers are
+        rendered from the whole document.
+        """
+        start, end = layer['offsets']
+        pieces = pieces + [(ancestors, start, end)]
+        body = b''.join(self.data[start:end] for ancestors, start, end in pieces)
+        needed = set()
+        references = [self.data[tag[0]:tag[1]] for piece in pieces for tag in piece[0]] + [body]
+        while references:
+            for match in REFERENCE.finditer(references.pop()):
+                id = (match.group(1) or match.group(2)).decode('utf-8')
+                if id in needed:
+                    continue
+                if id in self.referable:
+                    needed.add(id)
+                    ancestors, start, end = self.referable[id]
+                    references.append(self.data[start:end])
+                else:
+                    # Dangling references do not matter, ones to elements
+                    # that are left out do
+                    id = re.compile(rb'\sid\s*=\s*["\']%s["\']' % re.escape(id.encode('utf-8')))
+                    if id.search(self.data) and not id.search(body):
+                        return None
+        pieces = sorted(set(pieces + [self.referable[id] for id in needed]))
+
+        # Everything in document order, in the elements it was in
+        output = [self.data[:self.root_end]]
+        opened = []
+        for ancestors, start, end in sorted(pieces, key=lambda piece: piece[1]):
+            while opened != list(ancestors[:len(opened)]):
+                output.append(b'</%s>' % opened.pop()[2].encode('utf-8'))
+            for tag in ancestors[len(opened):]:
+                output.append(self.data[tag[0]:tag[1]])
+                opened.append(tag)
+            output.append(self.data[start:end])
+        while opened:
+            output.append(b'</%s>' % opened.pop()[2].encode('utf-8'))
+        output.append(b'</svg>\n')
+        return b'\n'.join(output)
+
+    def layer_hash(self, digest, related):
+        hash = hashlib.sha1()
+        for part in [self.definitions.hexdigest(), digest] + [d for d, plain in related]:
+            hash.update(part.encode('utf-8'))
+        return hash.hexdigest()
+
+    def track_start(self, name, attrs):
+        parent = self.regions[-1]
+        matrix = parse_transform(attrs.get('transform'), self.matrices[-1]) \
+            if self.matrices[-1] is not None else None
+        stroke = style_value(attrs, 'stroke-width')
+        stroke = number(stroke) if stroke is not None else self.strokes[-1]
+        filter = style_value(attrs, 'filter')
+        filtered = self.filtered[-1] or filter not in [None, 'none']
+        scope = hashlib.sha1(self.scopes[-1] + repr((name, sorted(attrs.items()))).encode('utf-8'))
+
+        if parent is not None:
+            region = parent
+        elif name in SKIPPED:
+            region = 'skip'
+        elif name in DEFINITIONS:
+            region = 'defs'
+        elif (name == "g" and attrs.get('inkscape:groupmode') == 'layer'
+              and attrs.get('inkscape:label', '').startswith('Baseplate')):
+            region = 'layer'
+            self.digest = hashlib.sha1()
+            self.references = set()
+            self.kinds = set()
+        elif name in DRAWABLES:
+            region = 'drawing'
+            self.digest = scope.copy()
+            self.references = set()
+            self.kinds = set()
+            self.drawing_plain = name in PLAIN_DRAWABLES and not filtered
+            box = transform_box(matrix, element_box(name, attrs))
+            if box is not None:
+                a, b, c, d = matrix[:4]
+                margin = stroke * max(abs(a), abs(b), abs(c), abs(d)) + 1
+                if filtered:
+                    # Blurs and shadows spill out of the shape's own box
+                    margin += max(box[2] - box[0], box[3] - box[1])
+                box = (box[0] - margin, box[1] - margin, box[2] + margin, box[3] + margin)
+            self.drawing_box = box
+        else:
+            region = None
+
+        if self.split:
+            start = self.offset()
+            tag = (start, START_TAG.match(self.data, start).end(), name)
+            if not self.tags:
+                self.root_end = tag[1]
+            # The top level drawings, and the definitions in a top level
+            # <defs> or on their own
+            piece = None
+            if ((region == 'drawing' and parent is None) or
+                (region == 'defs' and parent is None and name != 'defs') or
+                (parent == 'defs' and self.tags[-1][2] == 'defs' and self.regions[-2] is None)):
+                piece = (tuple(self.tags[1:]), start, attrs.get('id'))
+            self.tags.append(tag)
+            self.pieces.append(piece)
+
+        if region in ['layer', 'drawing', 'defs']:
+            references = self.definition_references if region == 'defs' else self.references
+            kinds = self.definition_kinds if region == 'defs' else self.kinds
+            kinds.add(element_features(name, attrs))
+            for key, value in attrs.items():
+                if key.endswith('href') and value.startswith('#'):
+                    references.add(value[1:])
+                else:
+                    references.update(URL_REFERENCE.findall(value))
+        self.elements.append((attrs.get('id'), len(self.drawings)))
+
+        self.regions.append(region)
+        self.matrices.append(matrix)
+        self.strokes.append(stroke)
+        self.filtered.append(filtered)
+        self.scopes.append(scope.digest())
+        self.track_data(repr((name, sorted(attrs.items()))))
+
+    def track_end(self, name):
+        self.track_data('/' + name)
+        region = self.regions.pop()
+        self.matrices.pop()
+        self.strokes.pop()
+        self.filtered.pop()
+        self.scopes.pop()
+        piece = None
+        if self.split:
+            self.tags.pop()
+            piece = self.pieces.pop()
+            if piece is not None:
+                ancestors, start, id = piece
+                piece = (ancestors, start, self.end_offset())
+                if id is not None:
+                    self.referable[id] = piece
+        if region == 'drawing' and self.regions[-1] is None:
+            self.drawings.append((self.drawing_box, self.digest.hexdigest(),
+                                  self.drawing_plain and self.drawing_box is not None, piece,
+                                  frozenset(self.references), frozenset(self.kinds)))
+        id, first = self.elements.pop()
+        if id is not None:
+            if region == 'drawing' and self.regions[-1] == 'drawing':
+                # Part of a drawing that is still open
+                self.drawing_ids[id] = [len(self.drawings)]
+            elif region in [None, 'drawing']:
+                self.drawing_ids[id] = range(first, len(self.drawings))
+
+    def track_data(self, data):
+        region = self.regions[-1]
+        if region == 'defs':
+            self.definitions.update(data.encode('utf-8'))
+        elif region in ['layer', 'drawing']:
+            self.digest.update(data.encode('utf-8'))
+
+    def startElement(self, name, attrs):
+        self.track_start(name, attrs)
+        if self.inside[-1] == self.ROOT:
+            if name == "svg":
+                self.stack.append(self.SVG)
+                self.inside.append(self.SVG)
+                return
+        elif self.inside[-1] == self.SVG:
+            if (name == "g" and ('inkscape:groupmode' in attrs) and ('inkscape:label' in attrs)
+               and attrs['inkscape:groupmode'] == 'layer' and attrs['inkscape:label'].startswith('Baseplate')):
+                self.stack.append(self.LAYER)
+                self.inside.append(self.LAYER)
+                self.context = None
+                self.icon_name = None
+                self.rects = []
+                self.layer_start = self.offset()
+                # The groups the layer is in, their transforms apply to it
+                self.layer_ancestors = tuple(self.tags[1:-1])
+                return
+        elif self.inside[-1] == self.LAYER:
+            if name == "text" and ('inkscape:label' in attrs) and attrs['inkscape:label'] == 'context':
+                self.stack.append(self.TEXT)
+                self.inside.append(self.TEXT)
+                self.text = 'context'
+                self.chars = ""
+                return
+            elif name == "text" and ('inkscape:label' in attrs) and attrs['inkscape:label'] == 'icon-name':
+                self.stack.append(self.TEXT)
+                self.inside.append(self.TEXT)
+                self.text = 'icon-name'
+                self.chars = ""
+                return
+            elif name == "rect":
+                box = (number(attrs.get('x')), number(attrs.get('y')),
+                       number(attrs.get('x')) + number(attrs.get('width')),
+                       number(attrs.get('y')) + number(attrs.get('height')))
+                self.rects.append({'id': attrs['id'], 'width': attrs['width'],
+                                   'height': attrs['height'],
+                                   'box': transform_box(self.matrices[-1], box)})
+
+        self.stack.append(self.OTHER)
+
+    def endElement(self, name):
+        self.track_end(name)
+        stacked = self.stack.pop()
+        if self.inside[-1] == stacked:
+            self.inside.pop()
+
+        if stacked == self.TEXT and self.text is not None:
+            assert self.text in ['context', 'icon-name']
+            if self.text == 'context':
+                self.context = self.chars
+            elif self.text == 'icon-name':
+                self.icon_name = self.chars
+            self.text = None
+        elif stacked == self.LAYER:
+            assert self.icon_name
+            assert self.context
+            end = self.end_offset()
+            self.layers.append({'context': self.context, 'icon-name': self.icon_name,
+                                'rects': self.rects, 'digest': self.digest.hexdigest(),
+                                'references': self.references, 'kinds': self.kinds,
+                                'offsets': [self.layer_start, end],
+                                'ancestors': self.layer_ancestors})
+
+            self.found.add(self.icon_name)
+            if self.filter is not None and self.found.issuperset(self.filter):
+                raise StopParsing()
+
+    def characters(self, chars):
+        self.track_data(chars)
+        self.chars += chars.strip()
+
+
+def render_file(file, output_dir=None, force=False, filter=None):
+    """Queue the exports of the stale assets of file, into output_dir or
+    else MAINDIR."""
+    with open(file, 'rb') as stream:
+        data = stream.read()
+    hash = hashlib.sha1(data).hexdigest()
+    renderer = LayerRenderer(file, output_dir or MAINDIR, force, filter=filter,
+                             batch=args.batch, scales=args.scale, split=args.split)
+
+    # An unchanged SVG needs no parsing at all, unless its layers have not
+    # been split yet
+    indexed = load_index(file)
+    start = time.monotonic()
+    if indexed.get('hash') == hash and not (
+            args.split and plan is None and
+            not all(layer.get('split') is False or
+                    os.path.exists(split_path(file, layer['hash']))
+                    for layer in indexed['layers'])):
+        renderer.indexed = True
+        renderer.render(indexed['layers'])
+        return
+
+    split = args.split and plan is None
+    handler = ContentHandler(data, filter=filter, split=split)
+    try:
+        handler.parse()
+        rendered = False
+    except StopParsing:
+        # Every requested icon was found: their exports go first, then all
+        # of the file is parsed for the index the next runs look them up in
+        renderer.parse_time = round(time.monotonic() - start, 3)
+        renderer.render(handler.layers)
+        handler = ContentHandler(data, split=split)
+        handler.parse()
+        rendered = True
+    for layer in handler.layers:
+        if 'document' in layer:
+            layer['split'] = write_split(file, layer['hash'], layer.pop('document'))
+    if not rendered:
+        renderer.parse_time = round(time.monotonic() - start, 3)
+        renderer.render(handler.layers)
+    save_index(file, hash, handler.layers)
+
+
+# Shared by main() and the requests a --daemon serves
+parser = argparse.ArgumentParser()
+parser.add_argument('file', nargs='?',
+                    help='SVG to render (without .svg); renders every SVG when omitted')
+parser.add_argument('icons', nargs='*',
+                    help='only render these icon names')
+parser.add_argument('-j', '--jobs', type=int, default=1,
+                    help='number of parallel Inkscape sessions (0 = one per CPU)')
+parser.add_argument('--batch', choices=['layer', 'svg'],
+                    help='export all stale rects of a layer or of a whole SVG '
+                         'with one Inkscape action list (needs Inkscape 1.x)')
+parser.add_argument('-s', '--scale', default=[1, 2],
+                    type=lambda value: [float(scale) for scale in value.split(',')],
+                    help='comma separated scales to export, e.g. 1,1.5,2 for '
+                         'name.png, name@1.5.png and name@2.png (default: 1,2)')
+parser.add_argument('-O', '--optimize-level', default=optimize_level,
+                    choices=['none'] + [str(level) for level in range(8)],
+                    help='optipng level, lower is faster (default: %(default)s)')
+parser.add_argument('--optimize-jobs', type=int, default=0,
+                    help='number of concurrent optipng processes (0 = one per CPU)')
+parser.add_argument('--optipng-cache-size', type=float, default=optimize_cache_size >> 20,
+                    help='megabytes of optipng results to keep in %s for reuse '
+                         'by identical renders, 0 to disable (default: %%(default)g)'
+                         % OPTIPNG_CACHE)
+parser.add_argument('--store',
+                    help='directory where the rendered images are shared, every '
+                         'target hardlinks the assets it has in common from there '
+                         '(default: %s in the output directory)' % STORE)
+parser.add_argument('--no-store', action='store_true',
+                    help='do not share the rendered images')
+parser.add_argument('--timeout', type=float, default=inkscape_timeout,
+                    help='seconds to wait for Inkscape to finish a command before '
+                         'restarting it (default: %(default)s)')
+parser.add_argument('--backend', default=rasterizer, choices=['auto'] + sorted(BACKENDS),
+                    help='rasterizer to use; auto renders the assets that rsvg-convert '
+                         'or cairosvg has been checked against Inkscape with them '
+                         '(default: %(default)s)')
+parser.add_argument('--check-backends', action='store_true',
+                    help='check the lightweight backend against Inkscape again '
+                         'for every asset that gets rendered')
+parser.add_argument('--backend-tolerance', type=int, default=backend_tolerance,
+                    help='largest per channel difference the backend check '
+                         'accepts (default: %(default)s)')
+parser.add_argument('--quantize', action='store_true',
+                    help='write the assets with at most 256 colours as paletted '
+                         'PNGs, which are smaller and inflate to a quarter of the '
+                         'data or less, and list what that saved')
+parser.add_argument('--quantize-tolerance', type=int, default=0, metavar='N',
+                    help='with --quantize, first merge colours that differ from a '
+                         'more common one by at most N per channel; 0 keeps every '
+                         'pixel as it is (default: %(default)s)')
+parser.add_argument('--watch', action='store_true',
+                    help='after rendering, keep running and render the changed '
+                         'layers of an SVG again every time it is saved')
+parser.add_argument('--source-dir', default=SRC,
+                    help='directory with the SVGs (default: %(default)s)')
+parser.add_argument('--output-dir', default=MAINDIR,
+                    help='directory the asset directories are written to '
+                         '(default: %(default)s)')
+parser.add_argument('--daemon', action='store_true',
+                    help='keep running and render for the other runs of these '
+                         'scripts, which then skip starting Inkscape')
+parser.add_argument('--no-daemon', action='store_true',
+                    help='render in this process even if a daemon is running')
+parser.add_argument('--socket', default=SOCKET,
+                    help='Unix socket of the daemon (default: %(default)s)')
+parser.add_argument('--atlas', action='store_true',
+                    help='also pack the assets of each context into one PNG per '
+                         'scale, with their offsets in %s.json; GTK and the window '
+                         'managers cannot slice images, so the CSS and theme files '
+                         'keep using the separate PNGs' % ATLAS)
+parser.add_argument('--split', action='store_true',
+                    help='render every layer from a document of its own, cut out '
+                         'with only the drawings and definitions it uses and kept '
+                         'in %s next to the SVGs; layers of a --batch are then '
+                         'exported one layer at a time' % SPLIT)
+parser.add_argument('--css', action='store_true',
+                    help='only render the layers whose assets the stylesheets use, '
+                         'at every scale, and list the assets they use that no '
+                         'layer renders and the ones rendered before that they '
+                         'do not use')
+parser.add_argument('--stylesheet', action='append', dest='stylesheets', metavar='CSS',
+                    help='stylesheet for --css, can be given more than once '
+                         '(default: the stylesheets of the theme that use these assets)')
+parser.add_argument('--log', metavar='FILE',
+                    help='append a JSON line per asset to FILE: its parse, render '
+                         'and optipng time, bytes before and after optipng, why it '
+                         'was or was not rendered and by which worker')
+parser.add_argument('--slowest', type=int, default=5, metavar='N',
+                    help='list the N slowest exports at the end, 0 to not list '
+                         'them (default: %(default)s)')
+parser.add_argument('--plan', action='store_true',
+                    help='list the assets that would be rendered, why and how long '
+                         'they should take, without rendering them; exits with '
+                         'status 1 if there is anything to render')
+
+
+def main(argv=None, source_dir=SRC, output_dir=MAINDIR, stylesheets=[]):
+    """The command line of the render scripts, rendering the SVGs in
+    source_dir into output_dir unless told otherwise, for stylesheets with
+    --css. Returns the exit status."""
+    global plan
+    parser.description = 'Render theme assets from SVGs in ' + source_dir
+    parser.set_defaults(source_dir=source_dir, output_dir=output_dir)
+    argv = sys.argv[1:] if argv is None else argv
+    options = parser.parse_args(argv)
+    if options.stylesheets is None:
+        options.stylesheets = [stylesheet for stylesheet in stylesheets
+                               if os.path.exists(stylesheet)]
+    if options.css and not options.stylesheets:
+        parser.error('--css needs a --stylesheet to take the assets from')
+    if options.watch and options.plan:
+        parser.error('--watch and --plan cannot be used together')
+    if options.daemon and (options.watch or options.plan or options.file):
+        parser.error('--daemon takes no file and cannot be used with --watch or --plan')
+    if options.backend == 'rsvg' and not os.path.exists(RSVG_CONVERT):
+        parser.error('--backend rsvg needs %s' % RSVG_CONVERT)
+    if options.backend == 'cairo' and cairosvg is None:
+        parser.error('--backend cairo needs the cairosvg module')
+
+    configure(options)
+
+    # Plain renders go to a running daemon, which has Inkscape started already
+    if not (options.daemon or options.no_daemon or options.watch or options.plan):
+        status = render_in_daemon(argv)
+        if status is not None:
+            return status
+
+    start_workers(options.jobs, options.optimize_jobs)
+    if options.plan:
+        plan = []
+    try:
+        if options.daemon or options.watch:
+            # Let a plain kill stop them as cleanly as ^C does
+            signal.signal(signal.SIGTERM, signal.default_int_handler)
+        if options.daemon:
+            try:
+                return serve(options.socket)
+            except KeyboardInterrupt:
+                return 0
+
+        status = render_files()
+        if status:
+            return status
+        if plan is not None:
+            print_plan()
+            return 1 if plan else 0
+        if options.watch:
+            save_manifests()
+            try:
+                watch(None if options.file is None else [options.file + '.svg'],
+                      filter=options.icons or None)
+            except KeyboardInterrupt:
+                pass
+        return 0
+    finally:
+        close()
@@ -0,0 +1,114 @@
+# Tests of the asset renderer that run without Inkscape or optipng, with
+# the stand-in Inkscape of bench-render-assets.py.
+#
+#   python3 -m unittest test_render_assets
+
+import os
+import sys
+import json
+import shutil
+import signal
+import tempfile
+import threading
+import subprocess
+import unittest
+
+SRCDIR = os.path.dirname(os.path.abspath(__file__))
+BENCH = os.path.join(SRCDIR, 'bench-render-assets.py')
+
+sys.path.insert(0, SRCDIR)
+import render_assets
+
+# Runs main() on the SVGs and output directory given on the command line
+LAUNCHER = '''
+import sys
+sys.path.insert(0, sys.argv[1])
+import render_assets
+sys.exit(render_assets.main(sys.argv[4:], source_dir=sys.argv[2], output_dir=sys.argv[3]))
+'''
+
+
+class WatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.dir, 'wm')
+        self.output = os.path.join(self.dir, 'output')
+        self.log = os.path.join(self.dir, 'assets.log')
+        os.makedirs(self.src)
+        os.makedirs(self.output)
+        shutil.copy(os.path.join(SRCDIR, 'wm', 'wm-assets.svg'), self.src)
+        inkscape = os.path.join(self.dir, 'inkscape')
+        with open(inkscape, 'w') as stream:
+            stream.write('#!/bin/sh\nexec "%s" "%s" --fake-inkscape "$@"\n'
+                         % (sys.executable, BENCH))
+        os.chmod(inkscape, 0o755)
+        missing = os.path.join(self.dir, 'missing')
+        self.env = dict(os.environ, INKSCAPE=inkscape, OPTIPNG=missing, RSVG_CONVERT=missing,
+                        BENCH_LATENCY='0', XDG_CACHE_HOME=os.path.join(self.dir, 'cache'),
+                        XDG_RUNTIME_DIR=self.dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def rendered(self):
+        """The assets the asset log says were exported, and empty the log."""
+        with open(self.log) as stream:
+            records = [json.loads(line) for line in stream]
+        os.remove(self.log)
+        return sorted(os.path.relpath(record['asset'], self.output) for record in records
+                      if record['result'] == 'rendered')
+
+    def read_until(self, process, text):
+        for line in process.stdout:
+            if text in line:
+                return line
+        self.fail('the watcher exited before printing %r' % text)
+
+    def test_only_changed_layers(self):
+        process = subprocess.Popen([sys.executable, '-c', LAUNCHER, SRCDIR, self.src,
+                                    self.output, '--watch', '--no-daemon', '--log', self.log],
+                                   env=self.env, stdout=subprocess.PIPE, universal_newlines=True)
+        # A hung watcher fails the test instead of blocking it
+        timer = threading.Timer(60, process.kill)
+        timer.start()
+        try:
+            self.read_until(process, 'Watching')
+            first = self.rendered()
+            self.assertIn('metacity-1/close.png', first)
+            self.assertIn('metacity-1/menu@2.png', first)
+
+            svg = os.path.join(self.src, 'wm-assets.svg')
+            with open(svg) as stream:
+                data = stream.read()
+            with open(svg, 'w') as stream:
+                stream.write(data.replace('inkscape:label="Baseplate close"',
+                                          'inkscape:label="Baseplate close" data-edited="1"'))
+            line = self.read_until(process, 'layers changed')
+            self.assertIn(': 1 of ', line)
+            self.assertEqual(self.rendered(), ['metacity-1/close.png', 'metacity-1/close@2.png'])
+        finally:
+            process.send_signal(signal.SIGINT)
+            process.communicate()
+            timer.cancel()
+        self.assertEqual(process.returncode, 0)
+
+
+
+class SplitTest(unittest.TestCase):
+
+    def test_layer_keeps_its_transforms(self):
+        with open(os.path.join(SRCDIR, 'wm', 'wm-assets.svg'), 'rb') as stream:
+            handler = render_assets.ContentHandler(stream.read(), split=True)
+        handler.parse()
+        # "Baseplate close" is in a layer translated by (0, -60)
+        layer = [layer for layer in handler.layers if layer['icon-name'] == 'close'][0]
+        split = render_assets.ContentHandler(layer['document'])
+        split.parse()
+        self.assertEqual(split.layers[0]['rects'], layer['rects'])
+        self.assertEqual(sorted(drawing[0] for drawing in split.related(layer['rects'])),
+                         sorted(drawing[0] for drawing in handler.related(layer['rects'])))
+
+
+if __name__ == '__main__':
+    unittest.main()